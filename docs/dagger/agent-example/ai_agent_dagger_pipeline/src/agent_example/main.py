@@ -1,5 +1,32 @@
+import json
+import time
+
 import dagger
-from dagger import dag, function, object_type
+from dagger import dag, field, function, object_type
+
+from pipeline_shared.agent_budget import AgentBudget, run_with_budget
+from pipeline_shared.github_client import GITHUB_API_URL, shared_client
+from pipeline_shared.telemetry import RunTelemetry, telemetry_summaries
+
+from .plan_summary import sample_plan, summarise_plan
+
+TELEMETRY_MODULE = "agent-example"
+
+# Resource counts for the small, medium and large sample plans used by benchmark_plan_summary
+BENCHMARK_PLAN_SIZES = {"small": 10, "medium": 100, "large": 1000}
+
+@object_type
+class AgentRunResult:
+    """The outcome of one LLM run, evaluated once and shared by everything that needs it."""
+    reply: str = field()
+    input_tokens: int = field()
+    output_tokens: int = field()
+    duration_seconds: float = field()
+    status: str = field(default="completed")
+    # Why a budgeted run stopped early, empty when it completed
+    reason: str = field(default="")
+    tool_calls: int = field(default=0)
+
 
 @object_type
 class AgentExample:
@@ -9,11 +36,52 @@ class AgentExample:
     - Execute a Terraform job in a containerized environment and analyze its output.
     """
 
+    async def run_agent(self, llm: dagger.LLM, budget: AgentBudget | None = None) -> AgentRunResult:
+        """
+        Evaluates an LLM run exactly once, or round by round within a budget, and captures its
+        reply, token usage and duration.
+
+        Args:
+            llm (dagger.LLM): The configured LLM to run.
+            budget (AgentBudget | None): Limits on tool calls, tokens and wall time. When given, the
+                agent runs in rounds and a run that exceeds the budget returns its partial reply
+                with the status `budget_exhausted`.
+
+        Returns:
+            AgentRunResult: The reply, token usage and wall-clock time of the run.
+        """
+        if budget is not None:
+            run = await run_with_budget(llm, budget)
+            return AgentRunResult(
+                reply=run.render(),
+                input_tokens=run.input_tokens,
+                output_tokens=run.output_tokens,
+                duration_seconds=run.duration_seconds,
+                status=run.status,
+                reason=run.reason,
+                tool_calls=run.tool_calls,
+            )
+
+        start = time.perf_counter()
+        # sync() pins the evaluated run, later reads come from its recorded state
+        completed = await llm.sync()
+        reply = await completed.last_reply()
+        duration = time.perf_counter() - start
+
+        usage = completed.token_usage()
+        return AgentRunResult(
+            reply=reply,
+            input_tokens=await usage.input_tokens(),
+            output_tokens=await usage.output_tokens(),
+            duration_seconds=duration,
+        )
+
     async def comment_on_pr(
         self,
         repo: str,
         comment_body: str,
         github_token: dagger.Secret,
+        github_api_url: str = GITHUB_API_URL,
     ) -> str:
         """
         Comments on the latest pull request authored by the authenticated user in the specified GitHub repository.
@@ -22,42 +90,16 @@ class AgentExample:
             repo (str): The GitHub repository in the format 'owner/repo'.
             comment_body (str): The text content of the comment to post.
             github_token (dagger.Secret): GitHub personal access token with repo permissions.
+            github_api_url (str): Base URL of the GitHub REST API, override to use a mock server.
 
         Returns:
-            str: The standard output from the container after commenting.
+            str: The URL of the posted comment.
         """
-        container = (
-            dag.container()
-            .from_("alpine:latest")
-            .with_secret_variable("GITHUB_TOKEN", github_token)
-            # Install required tools
-            .with_exec(["apk", "add", "--no-cache", "curl", "bash", "git", "openssl"])
-            # Download and install GitHub CLI (gh)
-            .with_exec([
-                "sh", "-c",
-                (
-                    "curl -fsSL https://github.com/cli/cli/releases/download/v2.70.0/gh_2.70.0_linux_amd64.tar.gz "
-                    "| tar -xz && mv gh_2.70.0_linux_amd64/bin/gh /usr/local/bin/"
-                )
-            ])
-            # Clone the specified GitHub repository
-            .with_exec(["git", "clone", f"https://github.com/{repo}.git"])
-            # Set the working directory to the cloned repo
-            .with_workdir(repo.split("/")[-1])
-            # Create a temporary markdown file with the comment
-            .with_new_file("/tmp/comment.md", contents=comment_body)
-            # Post a comment on the latest PR authored by the user
-            .with_exec([
-                "sh", "-c",
-                (
-                    "PR_NUMBER=$(gh pr list --author \"@me\" --limit 1 --json number --jq '.[0].number') && "
-                    f"gh pr comment $PR_NUMBER --body-file /tmp/comment.md --repo {repo}"
-                )
-            ])
-        )
+        github = shared_client(await github_token.plaintext(), github_api_url)
+        pull_request = await github.latest_pull_request_by_viewer(repo)
+        comment = await github.create_issue_comment(repo, pull_request["number"], comment_body)
 
-        # Return container output (e.g., result or logs)
-        return await container.stdout()
+        return comment["html_url"]
 
     @function
     async def terraform_agent(
@@ -68,7 +110,10 @@ class AgentExample:
         client_secret: dagger.Secret,
         subscription_id: dagger.Secret,
         tenant_id: dagger.Secret,
-        github_token: dagger.Secret
+        github_token: dagger.Secret,
+        github_api_url: str = GITHUB_API_URL,
+        max_tokens: int = 200_000,
+        deadline_seconds: float = 300.0,
     ) -> str:
         """
         Executes a Terraform job using credentials and a directory of Terraform configurations,
@@ -82,16 +127,19 @@ class AgentExample:
             subscription_id (dagger.Secret): Azure subscription ID for Terraform.
             tenant_id (dagger.Secret): Azure tenant ID for Terraform.
             github_token (dagger.Secret): GitHub token for posting the comment.
+            github_api_url (str): Base URL of the GitHub REST API, override to use a mock server.
+            max_tokens (int): Input plus output tokens the agent may use before it is stopped.
+            deadline_seconds (float): Wall-clock seconds the agent may run for.
 
         Returns:
-            str: The final analyzed result of the Terraform job.
+            str: The final analyzed result of the Terraform job. When the budget ran out it is the
+                partial result, headed by `[budget_exhausted: <reason>]`.
         """
-        # Set up the environment for Terraform execution
-        environment = (
-            dag.env()
-            .with_string_input("assignment", assignment, "the assignment to complete")
-            .with_container_input(
-                "terraform_runner",
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "terraform-agent")
+
+        try:
+            # Run init and plan, then reduce the JSON plan to the changes that matter
+            container = (
                 dag.container()
                     .from_("hashicorp/terraform:1.11")
                     .with_mounted_directory("/mnt", directory_arg)
@@ -100,25 +148,93 @@ class AgentExample:
                     .with_secret_variable("ARM_CLIENT_SECRET", client_secret)
                     .with_secret_variable("ARM_SUBSCRIPTION_ID", subscription_id)
                     .with_secret_variable("ARM_TENANT_ID", tenant_id)
-                    # Initialize and plan Terraform configuration
-                    .with_exec(["terraform", "init"])
-                    .with_exec(["terraform", "plan"]),
-                "a container to use for running the terraform init & plan"
             )
-            .with_container_output(
-                "completed", "the completed assignment in the Terraform container"
+            container = await telemetry.exec_step("terraform init", container.with_exec(["terraform", "init", "-input=false"]))
+            container = await telemetry.exec_step(
+                "terraform plan", container.with_exec(["terraform", "plan", "-input=false", "-out=/tmp/tfplan"])
             )
-        )
+            container = await telemetry.exec_step(
+                "terraform show", container.with_exec(["terraform", "show", "-json", "/tmp/tfplan"])
+            )
+            plan_json = await container.stdout()
+            async with telemetry.step("summarise plan", plan_bytes=len(plan_json)) as record:
+                plan_summary = summarise_plan(json.loads(plan_json))
+                record["summary_bytes"] = len(plan_summary)
 
-        # Use an LLM to analyze the Terraform results
-        analyze_results = (
-            dag.llm()
-            .with_env(environment)
-            .with_prompt_file(dag.current_module().source().file("terraformer_prompt.txt"))
-        )
+            # Only the compact summary goes into the environment, never the raw plan
+            environment = (
+                dag.env()
+                .with_string_input("assignment", assignment, "the assignment to complete")
+                .with_string_input("plan_summary", plan_summary, "a summary of the resource changes in the Terraform plan")
+            )
 
-        # Comment the LLM's last reply on a GitHub pull request
-        await self.comment_on_pr("codetocloudorg/platform-engineering", await analyze_results.last_reply(), github_token)
+            # The environment holds no container, so the agent has no commands to run and only
+            # the token and deadline limits of the budget can stop it. Its last reply is the review.
+            budget = AgentBudget(max_tokens=max_tokens, deadline_seconds=deadline_seconds)
+
+            # Use an LLM to analyze the Terraform results
+            analyze_results = (
+                dag.llm(max_api_calls=budget.max_api_calls)
+                .with_env(environment)
+                .with_prompt_file(dag.current_module().source().file("terraformer_prompt.txt"))
+            )
+
+            # Run the LLM once and share the result
+            async with telemetry.step("review plan", kind="llm") as record:
+                agent_run = await self.run_agent(analyze_results, budget)
+                record.update(
+                    input_tokens=agent_run.input_tokens,
+                    output_tokens=agent_run.output_tokens,
+                    status=agent_run.status,
+                    tool_calls=agent_run.tool_calls,
+                )
+
+            # Comment the LLM's last reply on a GitHub pull request
+            async with telemetry.step("comment on pr", kind="github"):
+                await self.comment_on_pr(
+                    "codetocloudorg/platform-engineering", agent_run.reply, github_token, github_api_url
+                )
+        finally:
+            await telemetry.save()
 
         # Return the analyzed result
-        return await analyze_results.last_reply()
\ No newline at end of file
+        return agent_run.reply
+
+    @function
+    async def benchmark_plan_summary(self, measure_with_llm: bool = False) -> str:
+        """
+        Records token counts of raw and summarised JSON plans for small, medium and large sample plans.
+
+        Args:
+            measure_with_llm (bool): Count input tokens with the configured LLM instead of estimating
+                them at four characters per token.
+
+        Returns:
+            str: One line per plan size with raw and summarised token counts.
+        """
+        lines = ["plan | resources | raw tokens | summary tokens"]
+        for label, resources in BENCHMARK_PLAN_SIZES.items():
+            plan = sample_plan(resources)
+            texts = [json.dumps(plan, indent=2), summarise_plan(plan)]
+
+            if measure_with_llm:
+                counts = [await dag.llm().with_prompt(text).token_usage().input_tokens() for text in texts]
+            else:
+                counts = [len(text) // 4 for text in texts]
+
+            lines.append(f"{label} | {resources} | {counts[0]} | {counts[1]}")
+
+        return "\n".join(lines)
+
+    @function
+    def telemetry_summaries(self) -> dagger.Directory:
+        """
+        Returns the JSON telemetry summaries of this module's past runs.
+
+        Each summary lists every step's duration, whether it was cached or only likely cached, and the LLM tokens it used.
+        Export them with `dagger call telemetry-summaries export --path ./telemetry`.
+
+        Returns:
+            dagger.Directory: One JSON file per run.
+        """
+        return telemetry_summaries(TELEMETRY_MODULE)
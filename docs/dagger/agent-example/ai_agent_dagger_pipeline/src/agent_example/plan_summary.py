@@ -0,0 +1,115 @@
+"""Reduce `terraform show -json` output to a compact change summary for the LLM.
+
+Only resources that change are listed, each with its address, action and the
+attributes that differ. Unchanged resources and unchanged attributes are counted
+but never rendered, and long values are cut short.
+"""
+import json
+
+ACTION_SYMBOLS = {"create": "+", "update": "~", "delete": "-", "replace": "-/+"}
+
+
+def plan_action(actions: list[str]) -> str:
+    """Collapse Terraform's action list into a single action name."""
+    if set(actions) == {"create", "delete"}:
+        return "replace"
+    return actions[0]
+
+
+def render_value(value, sensitive, max_value_length: int) -> str:
+    """Render one attribute value, masking sensitive ones and cutting long ones short."""
+    if sensitive:
+        return "(sensitive)"
+    rendered = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    if len(rendered) > max_value_length:
+        return rendered[:max_value_length] + f"... ({len(rendered) - max_value_length} chars elided)"
+    return rendered
+
+
+def changed_attributes(change: dict, action: str, max_value_length: int) -> list[str]:
+    """List the top-level attributes that differ between before and after."""
+    if action == "delete":
+        return []
+
+    before = change.get("before") or {}
+    after = change.get("after") or {}
+    after_unknown = change.get("after_unknown") or {}
+    before_sensitive = change.get("before_sensitive") or {}
+    after_sensitive = change.get("after_sensitive") or {}
+    if not isinstance(before_sensitive, dict):
+        before_sensitive = {}
+    if not isinstance(after_sensitive, dict):
+        after_sensitive = {}
+
+    lines = []
+    for key in sorted(set(before) | set(after) | set(after_unknown)):
+        if after_unknown.get(key) is True:
+            new = "(known after apply)"
+        else:
+            new = render_value(after.get(key), after_sensitive.get(key), max_value_length)
+
+        if action == "create":
+            if after.get(key) is None and not after_unknown.get(key):
+                continue
+            lines.append(f"    {key} = {new}")
+        elif before.get(key) != after.get(key) or after_unknown.get(key) is True:
+            old = render_value(before.get(key), before_sensitive.get(key), max_value_length)
+            lines.append(f"    {key}: {old} -> {new}")
+    return lines
+
+
+def summarise_plan(plan: dict, max_value_length: int = 80) -> str:
+    """Return a compact text summary of the resource changes in a JSON plan."""
+    counts = {"create": 0, "update": 0, "delete": 0, "replace": 0}
+    unchanged = 0
+    lines = []
+
+    for resource in plan.get("resource_changes", []):
+        change = resource.get("change", {})
+        action = plan_action(change.get("actions", ["no-op"]))
+        if action not in counts:
+            unchanged += 1
+            continue
+
+        counts[action] += 1
+        lines.append(f"{ACTION_SYMBOLS[action]} {resource['address']} ({action})")
+        lines.extend(changed_attributes(change, action, max_value_length))
+
+    header = (
+        f"Plan: {counts['create']} to create, {counts['update']} to update, "
+        f"{counts['replace']} to replace, {counts['delete']} to delete, "
+        f"{unchanged} unchanged (not shown)"
+    )
+    return "\n".join([header, *lines])
+
+
+def sample_plan(resources: int) -> dict:
+    """Build a synthetic JSON plan with a mix of actions, used to benchmark summarisation."""
+    resource_changes = []
+    for i in range(resources):
+        tags = {f"tag{t}": f"value-{t}" for t in range(20)}
+        base = {
+            "name": f"sa{i:04d}",
+            "location": "westus",
+            "account_tier": "Standard",
+            "account_replication_type": "LRS",
+            "tags": tags,
+            "network_rules": [{"default_action": "Deny", "ip_rules": [f"10.0.{i % 256}.{n}" for n in range(30)]}],
+        }
+        kind = i % 4
+        if kind == 0:
+            actions, before, after = ["create"], None, dict(base)
+        elif kind == 1:
+            actions, before, after = ["update"], dict(base), {**base, "account_replication_type": "GRS"}
+        elif kind == 2:
+            actions, before, after = ["no-op"], dict(base), dict(base)
+        else:
+            actions, before, after = ["delete", "create"], dict(base), {**base, "location": "eastus"}
+
+        after_unknown = {"id": True} if "create" in actions else {}
+        resource_changes.append({
+            "address": f"azurerm_storage_account.example[{i}]",
+            "change": {"actions": actions, "before": before, "after": after, "after_unknown": after_unknown},
+        })
+
+    return {"format_version": "1.2", "resource_changes": resource_changes}
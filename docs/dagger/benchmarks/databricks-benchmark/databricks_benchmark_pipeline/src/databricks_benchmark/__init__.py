@@ -0,0 +1,7 @@
+"""Benchmark entry points for the Databricks pipeline, owned by the benchmark harness.
+
+Wraps the pipeline module so the harness can swap in a mock Databricks CLI without
+the pipeline exposing a function for it.
+"""
+
+from .main import DatabricksBenchmark as DatabricksBenchmark
@@ -0,0 +1,56 @@
+import dagger
+from dagger import dag, function, object_type
+
+from databricks_pipeline.main import (
+    ALPINE_IMAGE,
+    DEFAULT_TARGET,
+    JOB_NAME,
+    TELEMETRY_MODULE,
+    DatabricksPipeline,
+    DatabricksRunResult,
+)
+from pipeline_shared.telemetry import telemetry_summaries
+
+
+@object_type
+class DatabricksBenchmark:
+    @function
+    async def deploy_and_run(
+        self,
+        directory_arg: dagger.Directory,
+        databricks_workspace_url: dagger.Secret,
+        databricks_client_secret: dagger.Secret,
+        databricks_client_id: dagger.Secret,
+        databricks_cli: dagger.File,
+        job_name: str = JOB_NAME,
+        target: str = DEFAULT_TARGET,
+        poll_interval_seconds: int = 10,
+        force: bool = False,
+        timeout_seconds: int = 3600,
+    ) -> DatabricksRunResult:
+        """Runs the pipeline's deploy_and_run with `databricks_cli` in place of the pinned CLI.
+
+        The harness passes a mock of the CLI, so this never reaches a workspace.
+        """
+        base = (
+            dag.container()
+            .from_(ALPINE_IMAGE)
+            .with_file("/usr/local/bin/databricks", databricks_cli, permissions=0o755)
+        )
+        return await DatabricksPipeline().run_deployment(
+            directory_arg,
+            databricks_workspace_url,
+            databricks_client_secret,
+            databricks_client_id,
+            job_name,
+            target,
+            poll_interval_seconds,
+            force,
+            timeout_seconds,
+            base=base,
+        )
+
+    @function
+    def telemetry_summaries(self) -> dagger.Directory:
+        """Returns the JSON telemetry summaries the pipeline stored, including those of these runs."""
+        return telemetry_summaries(TELEMETRY_MODULE)
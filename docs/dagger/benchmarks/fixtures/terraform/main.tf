@@ -0,0 +1,23 @@
+# Provider-free stand-in for the Azure root modules. terraform_data is built into
+# Terraform, so init and plan run without downloading providers or reaching Azure.
+terraform {
+  backend "local" {}
+}
+
+resource "terraform_data" "resource_group" {
+  input = {
+    name     = "rg-benchmark"
+    location = "westus"
+  }
+}
+
+resource "terraform_data" "storage_account" {
+  count = 20
+
+  input = {
+    name                     = format("sabenchmark%02d", count.index)
+    resource_group           = terraform_data.resource_group.output.name
+    account_tier             = "Standard"
+    account_replication_type = "LRS"
+  }
+}
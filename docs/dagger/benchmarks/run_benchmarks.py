@@ -0,0 +1,331 @@
+"""Offline benchmark harness for the example Dagger pipelines.
+
+Runs each module's functions with `dagger call` against local stand-ins:
+
+- a fake GitHub REST API and a stub OpenAI / Azure OpenAI endpoint (stubs.py)
+- Postgres seeded from seed_data/dvdrental.tar, served by the database module
+- a mock Databricks CLI (fixtures/databricks), swapped in by the databricks-benchmark module
+- a provider-free Terraform root with dummy Azure credentials (fixtures/terraform)
+
+Every scenario runs twice. The first pass is cold: pass --prune to empty the engine's
+cache before it, otherwise it is only as cold as the engine happens to be. The second
+pass is warm. For each pass the harness records the wall time, the exec steps the
+module built or got from cache (taken from the module's telemetry summary), LLM tokens
+and the size of the prompts the stub LLM received. The results are written to a JSON
+file, and --compare reports the change between two result files.
+
+Container images must already be in the engine's cache for a run without network.
+
+    python docs/dagger/benchmarks/run_benchmarks.py --prune
+    python docs/dagger/benchmarks/run_benchmarks.py --compare results/old.json results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from stubs import FakeGitHub, StubLLM
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+DAGGER_DIR = BENCHMARKS_DIR.parent
+REPO_ROOT = DAGGER_DIR.parents[1]
+FIXTURES = BENCHMARKS_DIR / "fixtures"
+
+# Includes the one-off restore of dvdrental when the engine has no seeded copy yet
+POSTGRES_START_SECONDS = 600
+
+# Credentials the stand-ins accept, passed to the modules as env:// secrets
+STUB_ENV = {
+    "OPENAI_API_KEY": "stub",
+    "OPENAI_MODEL": "stub-model",
+    "GITHUB_TOKEN": "benchmark",
+    "AZURE_OPENAI_API_KEY": "stub",
+    "ARM_CLIENT_ID": "00000000-0000-0000-0000-000000000000",
+    "ARM_CLIENT_SECRET": "benchmark",
+    "ARM_SUBSCRIPTION_ID": "00000000-0000-0000-0000-000000000000",
+    "ARM_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+    "DATABRICKS_HOST": "https://benchmark.cloud.databricks.com",
+    "DATABRICKS_CLIENT_ID": "benchmark",
+    "DATABRICKS_CLIENT_SECRET": "benchmark",
+}
+
+AZURE_ARGS = [
+    "--client-id=env://ARM_CLIENT_ID",
+    "--client-secret=env://ARM_CLIENT_SECRET",
+    "--subscription-id=env://ARM_SUBSCRIPTION_ID",
+    "--tenant-id=env://ARM_TENANT_ID",
+]
+DATABRICKS_ARGS = [
+    "--directory-arg={databricks_bundle}",
+    "--databricks-workspace-url=env://DATABRICKS_HOST",
+    "--databricks-client-id=env://DATABRICKS_CLIENT_ID",
+    "--databricks-client-secret=env://DATABRICKS_CLIENT_SECRET",
+]
+HACKATHON_ARGS = [
+    "--source={hackathon_dir}",
+    "--github-branch=benchmark",
+    "--github-repo=benchmark/dagger-hackathon",
+    "--github-token=env://GITHUB_TOKEN",
+    "--azure-api-key=env://AZURE_OPENAI_API_KEY",
+    "--azure-endpoint={llm_url}",
+    "--github-api-url={github_url}",
+]
+
+
+@dataclass
+class Scenario:
+    name: str
+    module: str
+    args: list[str]
+    # The run name the module's telemetry summary is stored under, if it keeps one
+    telemetry_run: str | None = None
+    needs_postgres: bool = False
+    # Arguments for the module's constructor, given before the function name
+    constructor_args: list[str] = field(default_factory=list)
+
+
+SCENARIOS = [
+    Scenario("terraform-plan", "terraform-example", ["plan", "--source={terraform_root}", *AZURE_ARGS], "plan"),
+    Scenario(
+        "terraform-plan-all", "terraform-example",
+        ["plan-all", "--source={terraform_root}", *AZURE_ARGS, "changed"], "plan-all",
+    ),
+    Scenario(
+        "agent-terraform-agent", "agent-example",
+        [
+            "terraform-agent", "--assignment=review the plan", "--directory-arg={terraform_root}",
+            *AZURE_ARGS, "--github-token=env://GITHUB_TOKEN", "--github-api-url={github_url}",
+        ],
+        "terraform-agent",
+    ),
+    Scenario("agent-plan-summary", "agent-example", ["benchmark-plan-summary"]),
+    Scenario(
+        "databricks-deploy-and-run", "benchmarks/databricks-benchmark",
+        [
+            "deploy-and-run", *DATABRICKS_ARGS, "--databricks-cli={databricks_cli}",
+            "--poll-interval-seconds=1", "status",
+        ],
+        "deploy-and-run",
+    ),
+    Scenario(
+        "hackathon-run-unit-tests", "dagger-hackathon", ["run-unit-tests", "success"],
+        constructor_args=HACKATHON_ARGS,
+    ),
+    Scenario(
+        "hackathon-fix-my-tests-agent", "dagger-hackathon", ["fix-my-tests-agent"], "fix-my-tests-agent",
+        constructor_args=HACKATHON_ARGS,
+    ),
+    Scenario(
+        "database-describe-tables", "database-agent-example",
+        ["describe-tables", "--svc={postgres}", "--tables=customer,rental,payment"], needs_postgres=True,
+    ),
+    Scenario(
+        "database-ask-agent", "database-agent-example",
+        ["ask-agent", "--svc={postgres}", "--table-name=staff", "--question=what are the staff names?"],
+        "ask-agent",
+        needs_postgres=True,
+    ),
+]
+
+
+def host_address() -> str:
+    """The host's outbound address, which containers in the Dagger engine can reach."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            # Nothing is sent, connecting only selects the outbound interface
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+        except OSError:
+            return "127.0.0.1"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(command: list[str], **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run(command, capture_output=True, text=True, **kwargs)
+
+
+def start_postgres(env: dict) -> tuple[str, subprocess.Popen]:
+    """Serve the database module's seeded Postgres on a host port and return its tcp:// address.
+
+    The module restores dvdrental once and the engine keeps the restored data directory,
+    so only the first run of the harness pays for the restore.
+    """
+    port = free_port()
+    tunnel = subprocess.Popen(
+        [
+            "dagger", "-m", str(DAGGER_DIR / "database-agent-example"), "call",
+            "seeded-postgres", "up", f"--ports={port}:5432",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + POSTGRES_START_SECONDS
+    while time.monotonic() < deadline:
+        if tunnel.poll() is not None:
+            sys.exit("Could not start the seeded Postgres service")
+        try:
+            socket.create_connection(("localhost", port), timeout=1).close()
+            return f"tcp://localhost:{port}", tunnel
+        except OSError:
+            time.sleep(1)
+
+    tunnel.terminate()
+    sys.exit("The seeded Postgres service did not become ready")
+
+
+def telemetry_summary(dagger_call: list[str], run_name: str, env: dict) -> dict | None:
+    """Read the newest telemetry summary the module stored for a run."""
+    # The hackathon module names its functions in PascalCase, the CLI shows both as kebab-case
+    with tempfile.TemporaryDirectory() as out:
+        exported = run([*dagger_call, "telemetry-summaries", "export", f"--path={out}"], env=env)
+        if exported.returncode != 0:
+            return None
+        # Run ids start with a UTC timestamp, so the newest sorts last
+        summaries = sorted(Path(out).glob(f"{run_name}-[0-9]*.json"))
+        if not summaries:
+            return None
+        summary = json.loads(summaries[-1].read_text())
+
+    steps = summary["steps"]
+    return {
+        "steps": len(steps),
+        "cached_steps": sum(step.get("cached") is True for step in steps),
+        # Judged by exec time only, see telemetry.py
+        "likely_built_steps": sum(step.get("likely_cached") is False for step in steps),
+        "likely_cached_steps": sum(step.get("likely_cached") is True for step in steps),
+        "input_tokens": summary["totals"]["input_tokens"],
+        "output_tokens": summary["totals"]["output_tokens"],
+        "hot_spots": summary["hot_spots"],
+    }
+
+
+def run_scenario(scenario: Scenario, context: dict, env: dict, llm: StubLLM, prune: bool, timeout: int) -> dict:
+    dagger_call = [
+        "dagger", "-m", str(DAGGER_DIR / scenario.module), "call",
+        *(arg.format(**context) for arg in scenario.constructor_args),
+    ]
+    command = [*dagger_call, *(arg.format(**context) for arg in scenario.args)]
+    result = {"name": scenario.name, "module": scenario.module}
+
+    for label in ["cold", "warm"]:
+        if label == "cold" and prune:
+            run(["dagger", "core", "engine", "local-cache", "prune"], env=env)
+        llm.take_prompt_stats()
+
+        start = time.perf_counter()
+        try:
+            completed = run(command, env=env, timeout=timeout)
+            exit_code, stderr = completed.returncode, completed.stderr
+        except subprocess.TimeoutExpired:
+            exit_code, stderr = None, f"timed out after {timeout}s"
+        elapsed = time.perf_counter() - start
+
+        result[label] = {
+            "seconds": round(elapsed, 3),
+            "exit_code": exit_code,
+            "prompts": llm.take_prompt_stats(),
+            "telemetry": telemetry_summary(dagger_call, scenario.telemetry_run, env) if scenario.telemetry_run else None,
+        }
+        if exit_code != 0:
+            result[label]["error"] = stderr[-2000:]
+        print(f"{scenario.name} {label}: {elapsed:.2f}s (exit {exit_code})", flush=True)
+
+    return result
+
+
+def git_commit() -> str:
+    head = run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT)
+    return head.stdout.strip() if head.returncode == 0 else "unknown"
+
+
+def compare(base_path: Path, head_path: Path, threshold: float) -> int:
+    """Print the change in wall time between two result files, return 1 on a regression."""
+    base = {s["name"]: s for s in json.loads(base_path.read_text())["scenarios"]}
+    head = {s["name"]: s for s in json.loads(head_path.read_text())["scenarios"]}
+
+    regressed = False
+    print(f"{'scenario':<32} {'pass':<5} {'base':>9} {'head':>9} {'change':>8}")
+    for name in sorted(base.keys() & head.keys()):
+        for label in ["cold", "warm"]:
+            before, after = base[name][label]["seconds"], head[name][label]["seconds"]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold:
+                regressed, flag = True, "  REGRESSION"
+            print(f"{name:<32} {label:<5} {before:>8.2f}s {after:>8.2f}s {change:>+7.0%}{flag}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the example pipelines against local stand-ins")
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--prune", action="store_true", help="Empty the engine cache before every cold pass")
+    parser.add_argument("--postgres", help="Use this running, seeded Postgres (tcp://host:port) instead of the module's")
+    parser.add_argument("--host-address", default=host_address(), help="Address the engine reaches the stubs on")
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds before a single pass is abandoned")
+    parser.add_argument("--output", type=Path, help="Where to write the results JSON")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BASE", "HEAD"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    if shutil.which("dagger") is None:
+        sys.exit("The dagger CLI is required")
+
+    scenarios = [s for s in SCENARIOS if not args.only or s.name in args.only]
+    commit = git_commit()
+    output = args.output or BENCHMARKS_DIR / "results" / f"{commit[:12]}.json"
+
+    postgres = args.postgres
+    tunnel = None
+    if any(s.needs_postgres for s in scenarios) and postgres is None:
+        postgres, tunnel = start_postgres({**os.environ, **STUB_ENV})
+
+    try:
+        with FakeGitHub() as github, StubLLM() as llm:
+            context = {
+                "github_url": f"http://{args.host_address}:{github.port}",
+                "llm_url": f"http://{args.host_address}:{llm.port}",
+                "postgres": postgres or "",
+                "terraform_root": FIXTURES / "terraform",
+                "databricks_cli": FIXTURES / "databricks",
+                "databricks_bundle": DAGGER_DIR / "dagger-databricks-example" / "databricks_asset_bundle",
+                "hackathon_dir": DAGGER_DIR / "dagger-hackathon",
+            }
+            env = {**os.environ, **STUB_ENV, "OPENAI_BASE_URL": f"{context['llm_url']}/v1"}
+            results = [run_scenario(s, context, env, llm, args.prune, args.timeout) for s in scenarios]
+    finally:
+        if tunnel is not None:
+            tunnel.terminate()
+            tunnel.wait()
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"platform": platform.platform(), "python": platform.python_version()},
+        "pruned": args.prune,
+        "scenarios": results,
+    }, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Local stand-ins for the services the example pipelines call.
+
+- FakeGitHub answers the handful of REST endpoints `github_client.py` uses, including
+  304 Not Modified for a pull request list the client has already fetched.
+- StubLLM is an OpenAI and Azure OpenAI compatible chat completions endpoint that
+  returns canned replies and records the size of every prompt it receives.
+
+Both run in a background thread on 0.0.0.0, so the Dagger engine can reach them
+through the host's address.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_LOGIN = "benchmark-bot"
+HEAD_SHA = "0" * 40
+# The pull request never changes, so revalidating the list always gets a 304
+PULLS_ETAG = '"benchmark-pulls"'
+
+# Canned replies, picked by the first pattern found in the prompt
+CANNED_REPLIES = [
+    (
+        re.compile(r"Code to fix the issue", re.IGNORECASE),
+        "Path: docs/dagger/dagger-hackathon/src/addition.py Line number: 2 Code to fix the issue: return a + b",
+    ),
+    (
+        re.compile(r"terraform", re.IGNORECASE),
+        "The plan creates the benchmark resources and changes nothing else. It is safe to apply.",
+    ),
+    (
+        re.compile(r"database|table|column", re.IGNORECASE),
+        "Based on the table summary, the answer is in the sampled rows.",
+    ),
+]
+DEFAULT_REPLY = "Done."
+STRUCTURED_REPLY = {
+    "changes": [
+        {"path": "docs/dagger/dagger-hackathon/src/addition.py", "line": "2", "change": "return a + b"},
+    ],
+}
+
+
+class StubServer:
+    """Runs an HTTP handler class in a daemon thread."""
+
+    handler: type[BaseHTTPRequestHandler]
+
+    def __init__(self, port: int = 0):
+        self.server = ThreadingHTTPServer(("0.0.0.0", port), self.handler)
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def send_json(self, status: int, body, headers: dict | None = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeGitHubHandler(JsonHandler):
+    def pull_request(self, repo: str) -> dict:
+        return {
+            "number": 1,
+            "html_url": f"https://github.com/{repo}/pull/1",
+            "head": {"sha": HEAD_SHA, "ref": "benchmark"},
+            "user": {"login": BOT_LOGIN},
+        }
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/user":
+            self.send_json(200, {"login": BOT_LOGIN})
+        elif match := re.fullmatch(r"/repos/([^/]+/[^/]+)/pulls", path):
+            if self.headers.get("If-None-Match") == PULLS_ETAG:
+                self.server.stub.not_modified += 1
+                self.send_response(304)
+                self.send_header("ETag", PULLS_ETAG)
+                self.end_headers()
+                return
+            self.send_json(200, [self.pull_request(match[1])], {"ETag": PULLS_ETAG})
+        else:
+            self.send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self.read_json() or {}
+        match = re.fullmatch(r"/repos/([^/]+/[^/]+)/(issues|pulls)/(\d+)/(comments|reviews)", path)
+        if match is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+
+        repo, _, number, kind = match.groups()
+        self.server.stub.posted.append({"path": path, "body": body})
+        anchor = "pullrequestreview" if kind == "reviews" else "issuecomment"
+        self.send_json(201, {
+            "id": len(self.server.stub.posted),
+            "body": body.get("body", ""),
+            "html_url": f"https://github.com/{repo}/pull/{number}#{anchor}-{len(self.server.stub.posted)}",
+        })
+
+
+class FakeGitHub(StubServer):
+    handler = FakeGitHubHandler
+
+    def __init__(self, port: int = 0):
+        super().__init__(port)
+        self.posted: list[dict] = []
+        # Conditional GETs answered with 304 Not Modified
+        self.not_modified = 0
+
+
+def canned_reply(prompt: str) -> str:
+    for pattern, reply in CANNED_REPLIES:
+        if pattern.search(prompt):
+            return reply
+    return DEFAULT_REPLY
+
+
+class StubLLMHandler(JsonHandler):
+    def do_POST(self):
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not Found"}})
+            return
+
+        body = self.read_json()
+        prompt = "\n".join(
+            message["content"] if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+            for message in body.get("messages", [])
+        )
+        if body.get("response_format"):
+            reply = json.dumps(STRUCTURED_REPLY)
+        else:
+            reply = canned_reply(prompt)
+
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(reply) // 4,
+            "total_tokens": (len(prompt) + len(reply)) // 4,
+        }
+        self.server.stub.requests.append({"prompt_chars": len(prompt), **usage})
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        common = {"id": completion_id, "created": int(time.time()), "model": body.get("model", "stub")}
+        if not body.get("stream"):
+            self.send_json(200, {
+                **common,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        chunks = [
+            {"index": 0, "delta": {"role": "assistant", "content": reply}, "finish_reason": None},
+            {"index": 0, "delta": {}, "finish_reason": "stop"},
+        ]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for choice in chunks:
+            event = {**common, "object": "chat.completion.chunk", "choices": [choice]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+        event = {**common, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class StubLLM(StubServer):
+    handler = StubLLMHandler
+
+    def __init__(self, port: int = 0):
+        super().__init__(port)
+        self.requests: list[dict] = []
+
+    def take_prompt_stats(self) -> dict:
+        """Summarise the prompts received since the last call and start counting afresh."""
+        requests, self.requests = self.requests, []
+        return {
+            "requests": len(requests),
+            "prompt_chars": sum(r["prompt_chars"] for r in requests),
+            "estimated_prompt_tokens": sum(r["prompt_tokens"] for r in requests),
+            "largest_prompt_chars": max((r["prompt_chars"] for r in requests), default=0),
+        }
@@ -1,47 +1,199 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+import uuid
+
 import dagger
-from dagger import dag, function, object_type
+from dagger import dag, field, function, object_type
+
+from pipeline_shared.agent_budget import AgentBudget, run_with_budget
+from pipeline_shared.command_memo import clear_memo, memo_session, memo_stats, memoise_commands
+from pipeline_shared.telemetry import RunTelemetry, telemetry_summaries
+
+# Pin the base image by digest and the CLI by release so the toolchain layers
+# only change when these values are bumped on purpose.
+ALPINE_IMAGE = "alpine:3.21.3@sha256:a8560b36e8b8210634f77d9f7f9efd7ffa463e380b75e2e74aff4511df3ef88c"
+DATABRICKS_CLI_VERSION = "0.250.0"
+
+PROFILE_NAME = "dagger_oauth_profile"
+CONFIG_PATH = "/root/.databrickscfg"
+JOB_NAME = "dagger_dbricks_job_tests"
+DEFAULT_TARGET = "dev"
+
+# Files that decide what a bundle deploy changes in the workspace. Anything else
+# (scratch notes, fixtures) never triggers a deploy on its own.
+BUNDLE_MANIFEST_FILES = ["databricks.yml", "src/notebook.ipynb", "tests/tests.ipynb", "resources/*.yml"]
+MANIFEST_CACHE_PATH = "/manifests"
+
+TELEMETRY_MODULE = "databricks-pipeline"
+
+# CLI calls the agent may repeat without a deploy or run in between: they read the
+# workspace or the bundle and change nothing. Every other `databricks` call is treated
+# as mutating and drops the memoised results.
+AGENT_READ_ONLY_COMMANDS = {
+    "databricks": (
+        r"((-p|--profile) [^ ]+ )?"
+        r"(jobs (list|get)|bundle (validate|summary)|clusters (list|get)|workspace (list|get-status)"
+        r"|version|help|--help|-h)"
+    ),
+}
+
+# Life cycle states after which a job run will not change anymore
+TERMINAL_RUN_STATES = {"TERMINATED", "SKIPPED", "INTERNAL_ERROR"}
+# Reported when deploy_and_run stops waiting, the run itself carries on in the workspace
+WAIT_TIMED_OUT = "WAIT_TIMED_OUT"
+
+
+@object_type
+class DatabricksTaskResult:
+    task_key: str = field()
+    status: str = field()
+    duration_seconds: float = field()
+
+
+@object_type
+class DatabricksRunResult:
+    run_id: str = field()
+    status: str = field()
+    run_page_url: str = field()
+    tasks: list[DatabricksTaskResult] = field(default=list)
+
+
+@object_type
+class DatabricksDeployResult:
+    target: str = field()
+    status: str = field()
+    duration_seconds: float = field()
+    output: str = field()
 
 
 @object_type
 class DatabricksPipeline:
+    def install_databricks_cli(self, container: dagger.Container) -> dagger.Container:
+        """Installs bash, curl and the pinned Databricks CLI on top of an Alpine container."""
+        return (
+            container
+            .with_exec(["apk", "add", "--no-cache", "bash", "curl"])
+            .with_exec([
+                "sh", "-c",
+                f"curl -fsSL https://raw.githubusercontent.com/databricks/setup-cli/v{DATABRICKS_CLI_VERSION}/install.sh | sh"
+            ])
+        )
+
     @function
-    def databricks_asset_bundle_deploy(
+    def databricks_cli_base(self) -> dagger.Container:
+        """Returns the shared Alpine container with the pinned Databricks CLI installed.
+
+        No secrets or directories are added here, so these layers are cached once and
+        reused by every function in this module.
+        """
+        return self.install_databricks_cli(dag.container().from_(ALPINE_IMAGE))
+
+    def databricks_container(
         self,
         directory_arg: dagger.Directory,
         databricks_workspace_url: dagger.Secret,
         databricks_client_secret: dagger.Secret,
         databricks_client_id: dagger.Secret,
+        base: dagger.Container | None = None,
     ) -> dagger.Container:
-        """Creates an Alpine container with Databricks CLI configured for OAuth M2M authentication. Deploys an asset bundle."""
-
-        profile_name = "dagger_oauth_profile"
-        config_path = "/root/.databrickscfg"
+        """Adds the bundle directory and OAuth M2M credentials on top of the cached CLI base."""
+        if base is None:
+            base = self.databricks_cli_base()
 
         return (
-            dag.container()
-            .from_("alpine:latest")
+            base
             .with_mounted_directory("/mnt", directory_arg)
             .with_workdir("/mnt")
-            .with_exec(["apk", "add", "--no-cache", "bash", "curl"])
-            .with_exec([
-                "sh", "-c",
-                "curl -fsSL https://raw.githubusercontent.com/databricks/setup-cli/main/install.sh | sh"
-            ])
             .with_secret_variable("DATABRICKS_HOST", databricks_workspace_url)
             .with_secret_variable("DATABRICKS_CLIENT_SECRET", databricks_client_secret)
             .with_secret_variable("DATABRICKS_CLIENT_ID", databricks_client_id)
-            .with_exec([
-                "sh", "-c",
-                f"""
-                echo '[{profile_name}]' > {config_path} && \
-                echo "host = $DATABRICKS_HOST" >> {config_path} && \
-                echo "client_id = $DATABRICKS_CLIENT_ID" >> {config_path} && \
-                echo "client_secret = $DATABRICKS_CLIENT_SECRET" >> {config_path}
-                """
-            ])
-            .with_exec(["databricks", "bundle", "deploy", "-t", "dev", "--profile", profile_name])
         )
-    
+
+    def configure_profile(self, container: dagger.Container) -> dagger.Container:
+        """Writes the OAuth M2M profile to the Databricks config file."""
+        return container.with_exec([
+            "sh", "-c",
+            f"""
+            echo '[{PROFILE_NAME}]' > {CONFIG_PATH} && \
+            echo "host = $DATABRICKS_HOST" >> {CONFIG_PATH} && \
+            echo "client_id = $DATABRICKS_CLIENT_ID" >> {CONFIG_PATH} && \
+            echo "client_secret = $DATABRICKS_CLIENT_SECRET" >> {CONFIG_PATH}
+            """
+        ])
+
+    def deploy_bundle(
+        self,
+        container: dagger.Container,
+        target: str = DEFAULT_TARGET,
+        force: bool = False,
+    ) -> dagger.Container:
+        """Deploys the bundle only when the files in BUNDLE_MANIFEST_FILES changed.
+
+        A sha256 manifest of the last successful deploy is kept per workspace and target in
+        a cache volume. Matching manifests skip the deploy. When only notebooks changed,
+        `databricks bundle sync` uploads them without redeploying the job resources.
+        """
+        files = " ".join(BUNDLE_MANIFEST_FILES)
+        forget_last_deploy = 'rm -f "$last"' if force else ""
+        script = f"""
+        for f in {files}; do
+            if [ -f "$f" ]; then sha256sum "$f"; fi
+        done > /tmp/manifest
+
+        last={MANIFEST_CACHE_PATH}/$(printf '%s {target}' "$DATABRICKS_HOST" | sha256sum | cut -c1-16)
+        {forget_last_deploy}
+        if [ -f "$last" ] && cmp -s /tmp/manifest "$last"; then
+            echo "Bundle unchanged since the last deploy, skipping"
+            exit 0
+        fi
+
+        grep -v -e ' src/' -e ' tests/' /tmp/manifest > /tmp/config.now
+        if [ -f "$last" ] && grep -v -e ' src/' -e ' tests/' "$last" | cmp -s /tmp/config.now -; then
+            echo "Only notebooks changed, syncing files"
+            databricks bundle sync -t {target} --profile {PROFILE_NAME} || exit 1
+        else
+            databricks bundle deploy -t {target} --profile {PROFILE_NAME} || exit 1
+        fi
+        cp /tmp/manifest "$last"
+        """
+
+        return (
+            container
+            .with_mounted_cache(MANIFEST_CACHE_PATH, dag.cache_volume("databricks-bundle-manifests"))
+            .with_exec(["sh", "-c", script])
+        )
+
+    @function
+    def databricks_asset_bundle_deploy(
+        self,
+        directory_arg: dagger.Directory,
+        databricks_workspace_url: dagger.Secret,
+        databricks_client_secret: dagger.Secret,
+        databricks_client_id: dagger.Secret,
+        target: str = DEFAULT_TARGET,
+        force: bool = False,
+    ) -> dagger.Container:
+        """Creates an Alpine container with Databricks CLI configured for OAuth M2M authentication. Deploys an asset bundle.
+
+        The deploy is skipped when the bundle is unchanged since the last successful deploy. Pass `force` to always deploy.
+        """
+
+        return self.deploy_bundle(
+            self.configure_profile(
+                self.databricks_container(
+                    directory_arg,
+                    databricks_workspace_url,
+                    databricks_client_secret,
+                    databricks_client_id,
+                )
+            ),
+            target,
+            force,
+        )
+
     @function
     def databricks_workflow_run(
         self,
@@ -49,35 +201,245 @@ class DatabricksPipeline:
         databricks_workspace_url: dagger.Secret,
         databricks_client_secret: dagger.Secret,
         databricks_client_id: dagger.Secret,
+        target: str = DEFAULT_TARGET,
     ) -> dagger.Container:
         """Creates an Alpine container with Databricks CLI configured for OAuth M2M authentication. Runs an asset bundle."""
-        
-        profile_name = "dagger_oauth_profile"
-        config_path = "/root/.databrickscfg"
 
         return (
+            self.configure_profile(
+                self.databricks_container(
+                    directory_arg,
+                    databricks_workspace_url,
+                    databricks_client_secret,
+                    databricks_client_id,
+                )
+            )
+            .with_exec(["databricks", "bundle", "run", "-t", target, JOB_NAME, "--profile", PROFILE_NAME])
+        )
+
+    @function
+    async def deploy_and_run(
+        self,
+        directory_arg: dagger.Directory,
+        databricks_workspace_url: dagger.Secret,
+        databricks_client_secret: dagger.Secret,
+        databricks_client_id: dagger.Secret,
+        job_name: str = JOB_NAME,
+        target: str = DEFAULT_TARGET,
+        poll_interval_seconds: int = 10,
+        force: bool = False,
+        timeout_seconds: int = 3600,
+    ) -> DatabricksRunResult:
+        """Deploys the asset bundle and runs a job from one configured container.
+
+        The job is started without waiting, then polled until it finishes. Status changes
+        are printed as they happen so they show up live in the Dagger output. A run still
+        going after `timeout_seconds` is returned as last polled, with the status
+        WAIT_TIMED_OUT.
+        """
+        return await self.run_deployment(
+            directory_arg,
+            databricks_workspace_url,
+            databricks_client_secret,
+            databricks_client_id,
+            job_name,
+            target,
+            poll_interval_seconds,
+            force,
+            timeout_seconds,
+        )
+
+    async def run_deployment(
+        self,
+        directory_arg: dagger.Directory,
+        databricks_workspace_url: dagger.Secret,
+        databricks_client_secret: dagger.Secret,
+        databricks_client_id: dagger.Secret,
+        job_name: str,
+        target: str,
+        poll_interval_seconds: int,
+        force: bool,
+        timeout_seconds: int,
+        base: dagger.Container | None = None,
+    ) -> DatabricksRunResult:
+        """Deploys and runs the job, from `base` instead of the pinned CLI image when given."""
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "deploy-and-run")
+        try:
+            configured = await telemetry.exec_step("configure cli", self.configure_profile(
+                self.databricks_container(
+                    directory_arg,
+                    databricks_workspace_url,
+                    databricks_client_secret,
+                    databricks_client_id,
+                    base=base,
+                )
+            ))
+            async with telemetry.step("deploy bundle", kind="exec", target=target) as record:
+                deployed = await self.deploy_bundle(configured, target, force).sync()
+                # An unchanged bundle is a hit on the deploy manifest cache
+                record["cached"] = "skipping" in await deployed.stdout()
+
+            # A new nonce per call so a cached result never hands back an old run id
+            submitted = await telemetry.exec_step(
+                "submit run",
+                deployed.with_env_variable("RUN_NONCE", uuid.uuid4().hex).with_exec([
+                    "sh", "-c",
+                    f"databricks bundle run -t {target} {job_name} --no-wait --profile {PROFILE_NAME} 2>&1"
+                ]),
+            )
+            run_output = await submitted.stdout()
+
+            match = re.search(r"/run/(\d+)", run_output)
+            if match is None:
+                raise ValueError(f"Could not find a run id in the bundle run output:\n{run_output}")
+            run_id = match.group(1)
+
+            last_status = ""
+            deadline = time.monotonic() + timeout_seconds
+            async with telemetry.step("wait for run", kind="poll", run_id=run_id) as record:
+                for polls in itertools.count(1):
+                    # Each poll must execute again instead of being served from cache
+                    run_details = json.loads(
+                        await deployed
+                        .with_env_variable("POLL_NONCE", uuid.uuid4().hex)
+                        .with_exec(["databricks", "jobs", "get-run", run_id, "-o", "json", "--profile", PROFILE_NAME])
+                        .stdout()
+                    )
+                    result = self.parse_run_result(run_details)
+                    if result.status != last_status:
+                        print(f"run {run_id}: {result.status}", flush=True)
+                        last_status = result.status
+
+                    if run_details.get("state", {}).get("life_cycle_state") in TERMINAL_RUN_STATES:
+                        record.update(polls=polls, status=result.status)
+                        break
+
+                    if time.monotonic() >= deadline:
+                        print(f"run {run_id}: stopped waiting after {timeout_seconds}s", flush=True)
+                        result.status = WAIT_TIMED_OUT
+                        record.update(polls=polls, status=result.status)
+                        break
+
+                    await asyncio.sleep(poll_interval_seconds)
+        finally:
+            await telemetry.save()
+        return result
+
+    def parse_run_result(self, run_details: dict) -> DatabricksRunResult:
+        """Converts the JSON from `databricks jobs get-run` into a DatabricksRunResult."""
+        state = run_details.get("state", {})
+        tasks = [
+            DatabricksTaskResult(
+                task_key=task.get("task_key", ""),
+                status=task.get("state", {}).get("result_state")
+                or task.get("state", {}).get("life_cycle_state", "UNKNOWN"),
+                # Databricks reports times in epoch milliseconds, end_time is 0 while running
+                duration_seconds=max(task.get("end_time", 0) - task.get("start_time", 0), 0) / 1000,
+            )
+            for task in run_details.get("tasks", [])
+        ]
+
+        return DatabricksRunResult(
+            run_id=str(run_details.get("run_id", "")),
+            status=state.get("result_state") or state.get("life_cycle_state", "UNKNOWN"),
+            run_page_url=run_details.get("run_page_url", ""),
+            tasks=tasks,
+        )
+
+    @function
+    async def deploy_to_targets(
+        self,
+        directory_arg: dagger.Directory,
+        targets: list[str],
+        databricks_workspace_urls: list[dagger.Secret],
+        databricks_client_secrets: list[dagger.Secret],
+        databricks_client_ids: list[dagger.Secret],
+        max_concurrency: int = 4,
+        force: bool = False,
+    ) -> list[DatabricksDeployResult]:
+        """Deploys the asset bundle to several targets at once.
+
+        Credentials are matched to targets by position. Pass a single set of credentials to
+        use the same workspace for every target. A failing target is reported in its result
+        and does not stop the others.
+        """
+        credentials = [databricks_workspace_urls, databricks_client_secrets, databricks_client_ids]
+        for values in credentials:
+            if len(values) not in (1, len(targets)):
+                raise ValueError("Pass one set of credentials or one per target")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def deploy(index: int, target: str) -> DatabricksDeployResult:
+            url, client_secret, client_id = (
+                values[index] if len(values) > 1 else values[0] for values in credentials
+            )
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    output = await self.databricks_asset_bundle_deploy(
+                        directory_arg, url, client_secret, client_id, target, force
+                    ).stdout()
+                    status = "succeeded"
+                except dagger.QueryError as e:
+                    output = e.stderr if isinstance(e, dagger.ExecError) else str(e)
+                    status = "failed"
+
+                return DatabricksDeployResult(
+                    target=target,
+                    status=status,
+                    duration_seconds=time.perf_counter() - start,
+                    output=output,
+                )
+
+        return list(await asyncio.gather(*(deploy(i, target) for i, target in enumerate(targets))))
+
+    @function
+    async def benchmark_deploy_and_run(
+        self,
+        directory_arg: dagger.Directory,
+        databricks_workspace_url: dagger.Secret,
+        databricks_client_secret: dagger.Secret,
+        databricks_client_id: dagger.Secret,
+    ) -> str:
+        """Compares cold and warm wall-clock time for a deploy followed by a run.
+
+        The cold pass rebuilds the toolchain layers from scratch. The warm pass reuses them
+        and only re-executes the deploy and run steps.
+        """
+        cold_base = self.install_databricks_cli(
             dag.container()
-            .from_("alpine:latest")
-            .with_mounted_directory("/mnt", directory_arg)
-            .with_workdir("/mnt")
-            .with_exec(["apk", "add", "--no-cache", "bash", "curl"])
-            .with_exec([
-                "sh", "-c",
-                "curl -fsSL https://raw.githubusercontent.com/databricks/setup-cli/main/install.sh | sh"
-            ])
-            .with_secret_variable("DATABRICKS_HOST", databricks_workspace_url)
-            .with_secret_variable("DATABRICKS_CLIENT_SECRET", databricks_client_secret)
-            .with_secret_variable("DATABRICKS_CLIENT_ID", databricks_client_id)
-            .with_exec([
-                "sh", "-c",
-                f"""
-                echo '[{profile_name}]' > {config_path} && \
-                echo "host = $DATABRICKS_HOST" >> {config_path} && \
-                echo "client_id = $DATABRICKS_CLIENT_ID" >> {config_path} && \
-                echo "client_secret = $DATABRICKS_CLIENT_SECRET" >> {config_path}
-                """
-            ])
-            .with_exec(["databricks", "bundle", "run", "-t", "dev", "dagger_dbricks_job_tests", "--profile", profile_name])
+            .from_(ALPINE_IMAGE)
+            .with_env_variable("BENCHMARK_NONCE", uuid.uuid4().hex)
+        )
+
+        timings = {}
+        for label, base in [("cold", cold_base), ("warm", cold_base)]:
+            # Bust the cache after the toolchain so deploy and run always execute
+            base = base.with_env_variable("BENCHMARK_RUN", uuid.uuid4().hex)
+            container = self.configure_profile(
+                self.databricks_container(
+                    directory_arg,
+                    databricks_workspace_url,
+                    databricks_client_secret,
+                    databricks_client_id,
+                    base=base,
+                )
+            )
+
+            start = time.perf_counter()
+            await container.with_exec(
+                ["databricks", "bundle", "deploy", "-t", DEFAULT_TARGET, "--profile", PROFILE_NAME]
+            ).sync()
+            await container.with_exec(
+                ["databricks", "bundle", "run", "-t", DEFAULT_TARGET, JOB_NAME, "--profile", PROFILE_NAME]
+            ).sync()
+            timings[label] = time.perf_counter() - start
+
+        return (
+            f"cold deploy+run: {timings['cold']:.2f}s\n"
+            f"warm deploy+run: {timings['warm']:.2f}s\n"
+            f"saved: {timings['cold'] - timings['warm']:.2f}s"
         )
 
     @function
@@ -88,27 +450,43 @@ class DatabricksPipeline:
         databricks_workspace_url: dagger.Secret,
         databricks_client_secret: dagger.Secret,
         databricks_client_id: dagger.Secret,
+        max_tool_calls: int = 20,
+        max_tokens: int = 200_000,
+        deadline_seconds: float = 300.0,
+        max_repeated_commands: int = 2,
+        memoise: bool = True,
     ) -> str:
+        """Lets an LLM complete an assignment in a configured Databricks container, within a budget.
+
+        The agent is stopped after `max_tool_calls` tool calls, `max_tokens` tokens or
+        `deadline_seconds`, or once it has run one identical command more than
+        `max_repeated_commands` times. A stopped run returns its partial result headed by
+        `[budget_exhausted: <reason>]`.
+
+        With `memoise`, read-only CLI calls that the agent repeats on an unchanged bundle
+        replay their first result for the rest of the run, see AGENT_READ_ONLY_COMMANDS.
         """
-        """
+        budget = AgentBudget(
+            max_tool_calls=max_tool_calls,
+            max_tokens=max_tokens,
+            deadline_seconds=deadline_seconds,
+            max_repeated_commands=max_repeated_commands,
+        )
+        runner = self.databricks_container(
+            directory_arg,
+            databricks_workspace_url,
+            databricks_client_secret,
+            databricks_client_id,
+        )
+        session = memo_session()
+        if memoise:
+            runner = memoise_commands(runner, AGENT_READ_ONLY_COMMANDS, "/mnt", session, (CONFIG_PATH,))
+
         environment = (
             dag.env()
             .with_string_input("assignment", assignment, "the assignment to complete")
             .with_container_input(
-                "databricks_runner",
-            dag.container()
-            .from_("alpine:latest")
-            .with_mounted_directory("/mnt", directory_arg)
-            .with_workdir("/mnt")
-            .with_exec(["apk", "add", "--no-cache", "bash", "curl"])
-            .with_exec([
-                "sh", "-c",
-                "curl -fsSL https://raw.githubusercontent.com/databricks/setup-cli/main/install.sh | sh"
-            ])
-            .with_secret_variable("DATABRICKS_HOST", databricks_workspace_url)
-            .with_secret_variable("DATABRICKS_CLIENT_SECRET", databricks_client_secret)
-            .with_secret_variable("DATABRICKS_CLIENT_ID", databricks_client_id),
-            "a container to use for analyzing databricks artifacts"
+                "databricks_runner", runner, "a container to use for analyzing databricks artifacts"
             )
             .with_container_output(
                 "completed", "the completed assignment in the Databricks container"
@@ -116,10 +494,38 @@ class DatabricksPipeline:
         )
 
         analyze_results = (
-            dag.llm()
+            dag.llm(max_api_calls=budget.max_api_calls)
             .with_env(environment)
             .with_prompt_file(dag.current_module().source().file("databricks_prompt.txt"))
         )
 
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "databricks-agent")
+        try:
+            async with telemetry.step("agent", kind="llm") as record:
+                run = await run_with_budget(analyze_results, budget)
+                record.update(
+                    input_tokens=run.input_tokens,
+                    output_tokens=run.output_tokens,
+                    status=run.status,
+                    reason=run.reason,
+                    rounds=run.rounds,
+                    tool_calls=run.tool_calls,
+                )
+                if memoise:
+                    record["memo_hits"], record["memo_misses"] = await memo_stats(runner, session)
+        finally:
+            await telemetry.save()
+            if memoise:
+                await clear_memo(session)
+
         # Return the analyzed result
-        return await analyze_results.last_reply()
+        return run.render()
+
+    @function
+    def telemetry_summaries(self) -> dagger.Directory:
+        """Returns the JSON telemetry summaries of this module's past runs.
+
+        Each summary lists every step's duration, whether it was cached or only likely cached, and the LLM tokens it used.
+        Export them with `dagger call telemetry-summaries export --path ./telemetry`.
+        """
+        return telemetry_summaries(TELEMETRY_MODULE)
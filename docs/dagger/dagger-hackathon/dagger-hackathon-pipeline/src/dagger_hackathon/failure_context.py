@@ -0,0 +1,131 @@
+"""Build a failure-scoped context for the unit test agent.
+
+Instead of the whole test log and source tree, the agent gets the traceback of each
+failing test and numbered excerpts of the files it implicates. These are the
+repository frames in the traceback, widened to the function they fall in, and the
+functions the failing test modules import from the repository.
+"""
+import ast
+import re
+
+TRACEBACK_FRAME = re.compile(r'File "(?P<path>[^"]+)", line (?P<line>\d+)')
+
+
+def traceback_frames(message: str, root: str) -> list[tuple[str, int]]:
+    """Return the (path, line) frames of a traceback that point into the repository at root."""
+    prefix = root.rstrip("/") + "/"
+    return [
+        (match["path"][len(prefix):], int(match["line"]))
+        for match in TRACEBACK_FRAME.finditer(message)
+        if match["path"].startswith(prefix)
+    ]
+
+
+def definitions(contents: str) -> list[ast.AST]:
+    """Every function and class definition in a file, or none when it does not parse."""
+    try:
+        tree = ast.parse(contents)
+    except SyntaxError:
+        return []
+    return [
+        node for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+
+
+def definition_range(node: ast.AST) -> tuple[int, int]:
+    start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+    return start, node.end_lineno
+
+
+def frame_range(contents: str, line: int, radius: int) -> tuple[int, int]:
+    """The innermost function around a line, or a window of radius lines when there is none."""
+    enclosing = [
+        definition_range(node) for node in definitions(contents)
+        if not isinstance(node, ast.ClassDef) and node.lineno <= line <= node.end_lineno
+    ]
+    if enclosing:
+        return max(enclosing)
+    return max(1, line - radius), line + radius
+
+
+def imported_modules(contents: str) -> dict[str, set[str] | None]:
+    """Map the candidate file paths of absolute imports to the names imported from them.
+
+    None means the whole module is imported, so the whole file is relevant.
+    """
+    try:
+        tree = ast.parse(contents)
+    except SyntaxError:
+        return {}
+
+    modules: dict[str, set[str] | None] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                base = alias.name.replace(".", "/")
+                modules[f"{base}.py"] = modules[f"{base}/__init__.py"] = None
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            base = node.module.replace(".", "/")
+            for alias in node.names:
+                for path in (f"{base}.py", f"{base}/__init__.py"):
+                    if modules.get(path, set()) is not None:
+                        modules.setdefault(path, set()).add(alias.name)
+                # `from package import module` imports a whole submodule
+                modules[f"{base}/{alias.name}.py"] = None
+    return modules
+
+
+def imported_ranges(contents: str, names: set[str] | None) -> list[tuple[int, int]]:
+    """The line ranges of the named top-level definitions, or the whole file."""
+    line_count = max(1, len(contents.splitlines()))
+    if names is None:
+        return [(1, line_count)]
+
+    try:
+        tree = ast.parse(contents)
+    except SyntaxError:
+        return [(1, line_count)]
+    return [
+        definition_range(node) for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name in names
+    ]
+
+
+def render_excerpt(path: str, contents: str, ranges: list[tuple[int, int]], max_file_lines: int) -> str:
+    """Render the merged line ranges of a file with line numbers, or all of it when it is short."""
+    lines = contents.splitlines()
+    if len(lines) <= max_file_lines:
+        ranges = [(1, len(lines))]
+
+    merged: list[list[int]] = []
+    for start, end in sorted((max(1, s), min(len(lines), e)) for s, e in ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    rendered = [f"### {path}"]
+    for index, (start, end) in enumerate(merged):
+        if index or start > 1:
+            rendered.append("     ...")
+        rendered.extend(f"{n:>5} | {lines[n - 1]}" for n in range(start, end + 1))
+    if merged and merged[-1][1] < len(lines):
+        rendered.append("     ...")
+    return "\n".join(rendered)
+
+
+def render_failure_context(
+    failures: list[tuple[str, str]],
+    files: dict[str, str],
+    ranges: dict[str, list[tuple[int, int]]],
+    max_file_lines: int = 80,
+) -> str:
+    """Render each failing test's traceback followed by the implicated file excerpts."""
+    sections = [f"## {label}\n{message.rstrip()}" for label, message in failures]
+    sections.append("## Implicated files")
+    sections.extend(
+        render_excerpt(path, files[path], ranges[path], max_file_lines)
+        for path in sorted(ranges)
+    )
+    return "\n\n".join(sections)
@@ -1,12 +1,62 @@
+import asyncio
 import dagger
+import functools
 import json
+import time
+import uuid
 from dagger import dag, field, function, object_type, DefaultPath
 from typing import Annotated
 
+from pipeline_shared.command_memo import clear_memo, memo_session, memo_stats, memoise_commands
+from pipeline_shared.github_client import GITHUB_API_URL, GitHubClient, shared_client
+from pipeline_shared.telemetry import RunTelemetry, telemetry_summaries
+
+from .failure_context import (
+    frame_range,
+    imported_modules,
+    imported_ranges,
+    render_failure_context,
+    traceback_frames,
+)
+from .structure_llm_response import AzureOpenAI, create_client, parse_responses, structure_response
+
+TELEMETRY_MODULE = "dagger-hackathon"
+TEST_DURATIONS_PATH = "/test-durations"
+# Used for tests that have not run before
+DEFAULT_TEST_DURATION = 1.0
+OUTCOME_LABELS = {"passed": "ok", "failed": "FAIL", "error": "ERROR", "skipped": "skipped"}
+# Pinned so the dependency layer of the structuring container is built once and then cached
+STRUCTURE_REQUIREMENTS = ["openai==1.82.0", "pydantic==2.11.5"]
+# Test runs the agent repeats on an unchanged /app return the same result; any other
+# python call drops the memoised runs, edits to /app change their key anyway
+TEST_RUN_COMMAND = r"(-[A-Za-z]+ )*-m (unittest|pytest)"
+AGENT_READ_ONLY_COMMANDS = {"python": TEST_RUN_COMMAND, "python3": TEST_RUN_COMMAND}
+
+@functools.cache
+def azure_client(endpoint: str, api_key: str) -> AzureOpenAI:
+    """One Azure OpenAI client per endpoint and key, reused across calls in this process"""
+    return create_client(endpoint, api_key)
+
+@object_type
+class TestCaseResult:
+    test_id: str = field()
+    outcome: str = field()
+    duration_seconds: float = field()
+    message: str = field()
+
 @object_type
 class UnitTestResults:
     result: str = field()
     success: str = field()
+    failing_tests: list[str] = field(default=list)
+    tests: list[TestCaseResult] = field(default=list)
+    duration_seconds: float = field(default=0.0)
+
+@object_type
+class FailureContext:
+    context: str = field()
+    source: dagger.Directory = field()
+    files: list[str] = field(default=list)
 
 @object_type
 class PrMetadataResult:
@@ -18,6 +68,8 @@ class ProposedCodeChange:
     path: str = field()
     line: str = field()
     change: str = field()
+    # "parser" when the reply matched the prompt's format, "llm" when it had to be extracted
+    source: str = field(default="llm")
 
 # same comment as above
 @object_type
@@ -25,6 +77,13 @@ class GitHubPrSuggestionResult:
     body: str = field()
     comment_url: str = field()
     
+@object_type
+class AgentRunResult:
+    reply: str = field()
+    input_tokens: int = field()
+    output_tokens: int = field()
+    duration_seconds: float = field()
+
 @object_type
 class AgentResponse:
     pr_metadata: PrMetadataResult = field()
@@ -39,6 +98,38 @@ class DaggerHackathon:
     azure_api_key: dagger.Secret
     azure_endpoint: str
     azure_model: str = "gpt-4o"
+    github_api_url: str = GITHUB_API_URL
+
+    async def RunAgent(self, llm: dagger.LLM) -> AgentRunResult:
+        """Evaluate an LLM run exactly once and capture its reply, token usage and duration
+        Args:
+            llm: The configured LLM to run
+        Returns:
+            AgentRunResult
+        """
+
+        start = time.perf_counter()
+        # sync() pins the evaluated run, later reads come from its recorded state
+        completed = await llm.sync()
+        reply = await completed.last_reply()
+        duration = time.perf_counter() - start
+
+        usage = completed.token_usage()
+        return AgentRunResult(
+            reply=reply,
+            input_tokens=await usage.input_tokens(),
+            output_tokens=await usage.output_tokens(),
+            duration_seconds=duration
+        )
+
+    async def GitHub(self) -> GitHubClient:
+        """The GitHub client shared by every call in this process
+        Returns:
+            GitHubClient
+        """
+
+        return shared_client(await self.github_token.plaintext(), self.github_api_url)
+
     @function
     async def GetPrMetadata(self) -> PrMetadataResult:
         """Get the PR number and commit ID
@@ -46,114 +137,257 @@ class DaggerHackathon:
             PrMetadataResult
         """
 
-        base_container = (
+        github = await self.GitHub()
+        pull_request = await github.find_pull_request(self.github_repo, self.github_branch)
+
+        return PrMetadataResult(pr_number=str(pull_request["number"]), commit_id=pull_request["head"]["sha"])
+
+    def UnitTestContainer(self) -> dagger.Container:
+        """Python container with the source and the test runner script mounted
+        Returns:
+            dagger.Container
+        """
+
+        return (
             dag.container()
-            .from_("alpine:latest")
-            .with_secret_variable("GITHUB_TOKEN", self.github_token)
-            .with_exec(["apk", "add", "--no-cache", "curl", "bash", "git", "openssl"])
-            .with_exec([
-                "sh", "-c",
-                (
-                    "curl -fsSL https://github.com/cli/cli/releases/download/v2.70.0/gh_2.70.0_linux_amd64.tar.gz "
-                    "| tar -xz && mv gh_2.70.0_linux_amd64/bin/gh /usr/local/bin/"
-                )
-            ])
+            .from_("python:3.11")
+            .with_mounted_directory("/src", self.source)
+            .with_workdir("/src")
+            .with_file(
+                "/runner/unit_test_runner.py",
+                dag.current_module().source().file("src/dagger_hackathon/unit_test_runner.py")
+            )
+            .with_mounted_cache(TEST_DURATIONS_PATH, dag.cache_volume("dagger-hackathon-test-durations"))
+            # Durations change on every run, so reads and writes must never come from the layer cache
+            .with_env_variable("RUN_NONCE", uuid.uuid4().hex)
         )
 
-        pr_number = await (
-            base_container
-            .with_exec([
-                "gh", "pr", "list",
-                "--head", f"{self.github_branch}",
-                "--limit", "1",
-                "--json", "number",
-                "--jq", ".[0].number",
-                "--repo", f"{self.github_repo}"
-            ])
-            .stdout()
-        )
+    def TestDurationsFile(self) -> str:
+        """Path of the durations recorded for this repository in the durations cache volume
+        Returns:
+            str
+        """
 
-        commit_logs = await (
-            base_container
-            .with_exec([
-                "gh", "pr", "view",
-                pr_number.strip(),
-                "--json", "commits",
-                "--repo", f"{self.github_repo}"
-            ])
-            .stdout()
-        )
+        return f"{TEST_DURATIONS_PATH}/{self.github_repo.replace('/', '_')}.json"
+
+    def ShardTests(self, test_ids: list[str], durations: dict[str, float], shards: int) -> list[list[str]]:
+        """Split tests into shards of roughly equal total duration
+        Args:
+            test_ids: The tests to split
+            durations: Seconds each test took on previous runs
+            shards: The number of shards to split into
+        Returns:
+            list[list[str]]
+        """
 
-        commit_logs_json = json.loads(commit_logs)
+        known = [durations[test_id] for test_id in test_ids if test_id in durations]
+        default = sum(known) / len(known) if known else DEFAULT_TEST_DURATION
 
-        head_commit_id = commit_logs_json["commits"][-1]["oid"]
-        
-        return PrMetadataResult(pr_number=pr_number.strip(), commit_id=head_commit_id.strip())
+        # Longest tests first, each into the shard with the least total duration so far
+        buckets = [(0.0, []) for _ in range(max(1, min(shards, len(test_ids))))]
+        for test_id in sorted(test_ids, key=lambda t: durations.get(t, default), reverse=True):
+            index = min(range(len(buckets)), key=lambda i: buckets[i][0])
+            total, ids = buckets[index]
+            buckets[index] = (total + durations.get(test_id, default), ids + [test_id])
+
+        return [ids for _, ids in buckets if ids]
 
     @function
-    async def RunUnitTests(self) -> UnitTestResults:
-        """Run all unit tests and return the results
+    async def RunUnitTests(self, shards: int = 4) -> UnitTestResults:
+        """Run all unit tests in parallel shards and return the per-test results
+        Args:
+            shards: The maximum number of containers to split the tests across
         Returns:
             UnitTestResults
         """
 
-        container = (
-            dag.container()
-            .from_("python:3.11")
-            .with_mounted_directory("/src", self.source)
-            .with_workdir("/src")
-            .with_exec(["sh", "-c", "python -m unittest discover tests -v || true"])
+        start = time.perf_counter()
+        container = self.UnitTestContainer()
+        durations_file = self.TestDurationsFile()
+
+        listed, durations = await asyncio.gather(
+            container.with_exec(["python", "/runner/unit_test_runner.py", "--list", "--output", "/tmp/tests.json"])
+            .file("/tmp/tests.json")
+            .contents(),
+            container.with_exec(["sh", "-c", f"cat {durations_file} 2>/dev/null || echo '{{}}'"]).stdout()
         )
-        
-        unit_test_results = await container.stderr()
+        test_ids = json.loads(listed)
+        durations = json.loads(durations)
+
+        async def run_shard(shard: list[str]) -> list[dict]:
+            results = await (
+                container
+                .with_exec(["python", "/runner/unit_test_runner.py", "--output", "/tmp/results.json", *shard])
+                .file("/tmp/results.json")
+                .contents()
+            )
+            return json.loads(results)
+
+        shard_results = await asyncio.gather(
+            *(run_shard(shard) for shard in self.ShardTests(test_ids, durations, shards))
+        )
+        order = {test_id: index for index, test_id in enumerate(test_ids)}
+        tests = [
+            TestCaseResult(
+                test_id=record["id"],
+                outcome=record["outcome"],
+                duration_seconds=record["duration"],
+                message=record["message"]
+            )
+            for results in shard_results
+            for record in results
+        ]
+        tests.sort(key=lambda test: order.get(test.test_id, len(order)))
+        duration = time.perf_counter() - start
+
+        # Rebalance the next run's shards with this run's durations
+        durations.update({test.test_id: test.duration_seconds for test in tests})
+        await (
+            container
+            .with_new_file("/tmp/durations.json", json.dumps(durations))
+            .with_exec(["cp", "/tmp/durations.json", durations_file])
+            .sync()
+        )
+
+        failing = [test for test in tests if test.outcome in ("failed", "error")]
 
-        if "OK" in unit_test_results:
-            success = "true"
+        # Rendered like `unittest -v` output, which is what the agent prompt expects
+        lines = [f"{test.test_id} ... {OUTCOME_LABELS[test.outcome]}" for test in tests]
+        for test in failing:
+            lines += ["=" * 70, f"{OUTCOME_LABELS[test.outcome]}: {test.test_id}", "-" * 70, test.message]
+        lines += ["-" * 70, f"Ran {len(tests)} tests in {duration:.3f}s", ""]
+        if failing:
+            failures = sum(test.outcome == "failed" for test in failing)
+            lines.append(f"FAILED (failures={failures}, errors={len(failing) - failures})")
         else:
-            success = "false"
-        
-        return UnitTestResults(result=unit_test_results, success=success)
+            lines.append("OK")
+
+        return UnitTestResults(
+            result="\n".join(lines),
+            success="false" if failing else "true",
+            failing_tests=[test.test_id for test in failing],
+            tests=tests,
+            duration_seconds=duration
+        )
 
-    @function
-    async def StructureLlmResponse(
+    async def BuildFailureContext(
         self,
-        response_to_structure: str
-    ) -> ProposedCodeChange:
-        """Structure LLM Response
+        unit_test_results: UnitTestResults,
+        window: int = 5
+    ) -> FailureContext:
+        """Collect the failing tests' tracebacks and only the source they implicate
         Args:
-            response_to_structure: LLM response to structure
+            unit_test_results: The unit test results with the failing tests
+            window: Lines kept on each side of a traceback line that is not inside a function
         Returns:
-            ProposedCodeChange
+            FailureContext
         """
 
-        command_to_execute = [
-            "python", "dagger-hackathon-pipeline/src/dagger_hackathon/structure_llm_response.py",
-            "--response", response_to_structure,
-            "--endpoint", self.azure_endpoint,
-            "--model", self.azure_model
+        failing = [
+            test for test in unit_test_results.tests
+            if test.test_id in unit_test_results.failing_tests
         ]
-        container = (
+        files: dict[str, str] = {}
+        ranges: dict[str, list[tuple[int, int]]] = {}
+
+        async def read(paths: list[str]) -> list[str]:
+            existing = [path for path in paths if path not in files and await self.source.glob(path)]
+            contents = await asyncio.gather(*(self.source.file(path).contents() for path in existing))
+            files.update(zip(existing, contents))
+            return existing
+
+        # The repository frames of every traceback, widened to the function around them
+        frames = [frame for test in failing for frame in traceback_frames(test.message, "/src")]
+        await read(sorted({path for path, _ in frames}))
+        for path, line in frames:
+            if path in files:
+                ranges.setdefault(path, []).append(frame_range(files[path], line, window))
+
+        # Assertions fail in the test, so also pull in what the failing test modules import
+        for path in list(ranges):
+            imports = imported_modules(files[path])
+            await read(sorted(imports))
+            for module_path, names in imports.items():
+                if module_path in files:
+                    ranges.setdefault(module_path, []).extend(imported_ranges(files[module_path], names))
+
+        context = render_failure_context(
+            [(f"{OUTCOME_LABELS[test.outcome]}: {test.test_id}", test.message) for test in failing],
+            files,
+            ranges
+        )
+
+        # Package markers keep imports working in the trimmed source
+        paths = sorted(set(ranges) | set(await self.source.glob("**/__init__.py")))
+        source = dag.directory()
+        for path in paths:
+            source = source.with_file(path, self.source.file(path))
+
+        return FailureContext(context=context, source=source, files=sorted(ranges))
+
+    def StructureLlmContainer(self) -> dagger.Container:
+        """Python container with the structuring dependencies installed and the script mounted
+        Returns:
+            dagger.Container
+        """
+
+        return (
             dag.container()
             .from_("python:3.11")
-            .with_mounted_directory("/app", self.source)
+            .with_mounted_cache("/root/.cache/pip", dag.cache_volume("dagger-hackathon-pip"))
+            # Installed before anything that changes between runs, so this layer stays cached
+            .with_exec(["pip", "install", *STRUCTURE_REQUIREMENTS])
+            .with_file(
+                "/app/structure_llm_response.py",
+                dag.current_module().source().file("src/dagger_hackathon/structure_llm_response.py")
+            )
             .with_workdir("/app")
             .with_secret_variable("AZURE_OPENAI_API_KEY", self.azure_api_key)
-            .with_exec(["pip", "install", "--upgrade", "pip"])
-            .with_exec(["pip", "install", "openai==1.82.0", "pydantic==2.11.5"])  
-            .with_exec(["sh", "-c", "export $(grep -v '^#' .env | xargs)"])
-            .with_exec(["sh", "-c", "echo $OPENAI_API_KEY"])
-            .with_exec(command_to_execute)
         )
 
-        structured_results = await container.stdout()
+    @function
+    async def StructureLlmResponse(
+        self,
+        response_to_structure: str,
+        in_process: bool = True
+    ) -> list[ProposedCodeChange]:
+        """Structure LLM Response into one change per proposed fix
+        Args:
+            response_to_structure: LLM response to structure
+            in_process: Call Azure OpenAI from the module with a shared client instead of a container
+        Returns:
+            list[ProposedCodeChange]
+        """
 
-        structured_results_json = json.loads(structured_results)
-        
-        return ProposedCodeChange(
-            path=structured_results_json["path"],
-            line=structured_results_json["line"],
-            change=structured_results_json["change"]
-        )
+        source = "parser"
+        changes = parse_responses(response_to_structure)
+        if changes is not None:
+            changes_json = [change.model_dump() for change in changes]
+        elif in_process:
+            source = "llm"
+            client = azure_client(self.azure_endpoint, await self.azure_api_key.plaintext())
+            # The OpenAI client is synchronous, keep it off the event loop
+            structured = await asyncio.to_thread(
+                structure_response, client, self.azure_model, response_to_structure
+            )
+            changes_json = [change.model_dump() for change in structured]
+        else:
+            source = "llm"
+            command_to_execute = [
+                "python", "structure_llm_response.py",
+                "--response", response_to_structure,
+                "--endpoint", self.azure_endpoint,
+                "--model", self.azure_model
+            ]
+            structured_results = await self.StructureLlmContainer().with_exec(command_to_execute).stdout()
+            changes_json = json.loads(structured_results)["changes"]
+
+        # Tests that fail for the same reason get the same fix, suggest each line only once
+        unique = {(change["path"], str(change["line"])): change for change in changes_json}
+        return [
+            ProposedCodeChange(path=path, line=line, change=change["change"], source=source)
+            for (path, line), change in unique.items()
+        ]
 
     @function
     async def CreatePrSuggestion(
@@ -169,94 +403,159 @@ class DaggerHackathon:
             GitHubPrSuggestionResult
         """
 
-        command_to_execute = [
-            "gh", "api",
-            "--method", "POST",
-            "-H", "Accept: application/vnd.github+json",
-            "-H", "X-GitHub-Api-Version: 2022-11-28",
-            f"/repos/codetocloudorg/platform-engineering/pulls/{pr_metadata.pr_number}/comments",
-            "-f", f"body=```suggestion\n{proposed_code_changes.change}\n```",
-            "-f", f"commit_id={pr_metadata.commit_id}",
-            "-f", f"path={proposed_code_changes.path}",
-            "-F", f"line={proposed_code_changes.line}",
-            "-f", "side=RIGHT"
-            ]
+        return await self.CreatePrReview(pr_metadata, [proposed_code_changes])
 
-        container = (
-            dag.container()
-            .from_("alpine:latest")
-            .with_secret_variable("GITHUB_TOKEN", self.github_token)
-            .with_exec(["apk", "add", "--no-cache", "curl", "bash", "git", "openssl"])
-            .with_exec([
-                "sh", "-c",
-                (
-                    "curl -fsSL https://github.com/cli/cli/releases/download/v2.70.0/gh_2.70.0_linux_amd64.tar.gz "
-                    "| tar -xz && mv gh_2.70.0_linux_amd64/bin/gh /usr/local/bin/"
-                )
-            ])
-            .with_exec(command_to_execute)
-        )
+    @function
+    async def CreatePrReview(
+        self,
+        pr_metadata: PrMetadataResult,
+        proposed_code_changes: list[ProposedCodeChange],
+        ) -> GitHubPrSuggestionResult:
+        """Create one PR review with a code suggestion per proposed change, in a single API call
+        Args:
+            pr_metadata: PR Metadata
+            proposed_code_changes: Proposed Code Changes
+        Returns:
+            GitHubPrSuggestionResult
+        """
 
-        pr_comment_logs = await container.stdout()
+        comments = [
+            {
+                "path": change.path,
+                "line": int(change.line),
+                "body": f"```suggestion\n{change.change}\n```",
+            }
+            for change in proposed_code_changes
+        ]
 
-        pr_comment_logs_json = json.loads(pr_comment_logs)
+        github = await self.GitHub()
+        review = await github.create_review(
+            self.github_repo,
+            int(pr_metadata.pr_number),
+            commit_id=pr_metadata.commit_id,
+            comments=comments,
+            body=f"{len(comments)} suggested fix(es) for the failing unit tests",
+        )
 
         return GitHubPrSuggestionResult(
-            body=pr_comment_logs_json["body"],
-            comment_url=pr_comment_logs_json["html_url"]
+            body=review["body"],
+            comment_url=review["html_url"]
         )
 
     @function
     async def FixMyTestsAgent(
-        self
+        self,
+        memoise: bool = True
         ) -> str:
         """Orchestrator Agent to Debug Unit Tests
+        Args:
+            memoise: replay passing test runs the agent repeats on unchanged sources
         Returns:
             AgentResponse
         """
 
-        pr_metadata = await self.GetPrMetadata()
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "fix-my-tests-agent")
+        session = memo_session()
 
-        unit_test_results = await self.RunUnitTests()
+        try:
+            async with telemetry.step("get pr metadata", kind="github"):
+                pr_metadata = await self.GetPrMetadata()
 
-        if unit_test_results.success == "true":
-            return f"All unit tests passed - no code changes needed"
+            async with telemetry.step("run unit tests", kind="exec") as record:
+                unit_test_results = await self.RunUnitTests()
+                record.update(tests=len(unit_test_results.tests), failing=len(unit_test_results.failing_tests))
+
+            if unit_test_results.success == "true":
+                return f"All unit tests passed - no code changes needed"
         
-        environment = (
-            dag.env()
-            .with_string_input("unit_test_results", str(unit_test_results), "the unit test results to analyze")
-            .with_container_input(
-                "unit_test_runner",
+            async with telemetry.step("build failure context") as record:
+                failure_context = await self.BuildFailureContext(unit_test_results)
+                record.update(context_bytes=len(failure_context.context), files=len(failure_context.files))
+
+            unit_test_runner = (
                 dag.container()
                 .from_("python:3.11")
-                .with_mounted_directory("/app", self.source)
-                .with_workdir("/app"),
-                "a container used to troubleshoot failing unit tests"
+                .with_mounted_directory("/app", failure_context.source)
+                .with_workdir("/app")
             )
-            .with_container_output(
-                "completed", "the completed assignment in the unit test container"
+            if memoise:
+                unit_test_runner = memoise_commands(unit_test_runner, AGENT_READ_ONLY_COMMANDS, "/app", session)
+
+            environment = (
+                dag.env()
+                .with_string_input(
+                    "failure_context",
+                    failure_context.context,
+                    "the failing tests' tracebacks and the source lines they implicate"
+                )
+                .with_container_input(
+                    "unit_test_runner",
+                    unit_test_runner,
+                    "a container used to troubleshoot failing unit tests"
+                )
+                .with_container_output(
+                    "completed", "the completed assignment in the unit test container"
+                )
             )
-        )
 
-        analyze_results = (
-            dag.llm()
-            .with_env(environment)
-            .with_prompt_file(dag.current_module().source().file("debug_unit_test_prompt.md"))
-        )
+            analyze_results = (
+                dag.llm()
+                .with_env(environment)
+                .with_prompt_file(dag.current_module().source().file("debug_unit_test_prompt.md"))
+            )
 
-        analyzed_results_output = await analyze_results.last_reply()
+            async with telemetry.step("agent", kind="llm") as record:
+                agent_run = await self.RunAgent(analyze_results)
+                record.update(input_tokens=agent_run.input_tokens, output_tokens=agent_run.output_tokens)
+                if memoise:
+                    record["memo_hits"], record["memo_misses"] = await memo_stats(unit_test_runner, session)
 
-        proposed_code_change = await self.StructureLlmResponse(
-            await analyze_results.last_reply()
-        )
+            async with telemetry.step("structure llm response") as record:
+                proposed_code_changes = await self.StructureLlmResponse(
+                    agent_run.reply
+                )
+                record.update(
+                    source=proposed_code_changes[0].source if proposed_code_changes else "",
+                    changes=len(proposed_code_changes)
+                )
 
-        created_pr_suggestion = await self.CreatePrSuggestion(
-            pr_metadata, 
-            proposed_code_change
-        )
+            if not proposed_code_changes:
+                return "The agent proposed no code changes"
+
+            # The agent run can take minutes. Revalidating the PR is a conditional GET on the
+            # shared client, answered with a 304 unless someone pushed in the meantime. Suggestions
+            # for a commit that is no longer the head would patch code that may have changed.
+            async with telemetry.step("check pr head", kind="github") as record:
+                current_pr_metadata = await self.GetPrMetadata()
+                record["head_moved"] = current_pr_metadata.commit_id != pr_metadata.commit_id
+
+            if record["head_moved"]:
+                return (
+                    f"The PR head moved from {pr_metadata.commit_id} to {current_pr_metadata.commit_id} "
+                    "while the agent ran, no suggestions were posted"
+                )
+
+            async with telemetry.step("create pr review", kind="github"):
+                created_pr_suggestion = await self.CreatePrReview(
+                    pr_metadata,
+                    proposed_code_changes
+                )
+
+            return str(AgentResponse(
+                pr_metadata=pr_metadata,
+                pr_suggestions=created_pr_suggestion
+            ))
+        finally:
+            await telemetry.save()
+            if memoise:
+                await clear_memo(session)
+        
+
+    @function
+    def TelemetrySummaries(self) -> dagger.Directory:
+        """Get the JSON telemetry summaries of this module's past runs
+        Returns:
+            dagger.Directory
+        """
 
-        return str(AgentResponse(
-            pr_metadata=pr_metadata,
-            pr_suggestions=created_pr_suggestion
-        ))
-        
\ No newline at end of file
+        return telemetry_summaries(TELEMETRY_MODULE)
@@ -1,37 +1,98 @@
 import argparse
-from pydantic import BaseModel, Field
+import re
+import sys
+from pydantic import BaseModel, Field, ValidationError
 from openai import AzureOpenAI
-import os
 
 class ProposedCodeChangesPydantic(BaseModel):
     path: str = Field(description="The path to the source file. ie: docs/dagger/dagger-hackathon/src/file.py")
     line: str = Field(description="The line number. ie: 10")
     change: str = Field(description="The proposed code change. ie: return 8 * 6")
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--response", required=True, help="The LLM response to structure")
-    parser.add_argument("--endpoint", required=True, help="The Azure OpenAI Endpoint")
-    parser.add_argument("--model", required=True, help="The Azure OpenAI Model")
-    args = parser.parse_args()
+class ProposedCodeChangeListPydantic(BaseModel):
+    changes: list[ProposedCodeChangesPydantic] = Field(description="One proposed code change per fix in the reply")
+
+API_VERSION = "2024-12-01-preview"
+
+# The reply format debug_unit_test_prompt.md asks for, labels optionally in bold or code spans
+PROPOSED_CHANGE_FORMAT = re.compile(
+    r"^[*`\s]*Path:[*`\s]*(?P<path>[^\s`*]+)[*`\s]+"
+    r"Line number:[*`\s]*(?P<line>\d+)[*`\s]+"
+    r"Code to fix the issue:[*\s]*(?P<change>.+?)\s*$",
+    re.DOTALL | re.IGNORECASE
+)
+# Every proposed change starts on a new line with its Path label
+CHANGE_START = re.compile(r"^(?=[*` \t]*Path:)", re.MULTILINE | re.IGNORECASE)
+
+def parse_response(response: str) -> ProposedCodeChangesPydantic | None:
+    """Parse a reply in the prompt's "Path: ... Line number: ... Code to fix the issue: ..." format
+
+    Returns None when the reply does not match exactly, so the caller can fall back to the LLM.
+    """
+    match = PROPOSED_CHANGE_FORMAT.match(response.strip())
+    if not match:
+        return None
+
+    change = match["change"]
+    # A single code span or fence around the change is formatting, not code
+    fenced = re.fullmatch(r"```[\w+-]*\n(.*?)\n?```|`([^`]+)`", change, re.DOTALL)
+    if fenced:
+        change = fenced[1] if fenced[1] is not None else fenced[2]
+    if not change.strip() or "\n" in change.strip("\n"):
+        return None
 
-    client = AzureOpenAI(
-        azure_endpoint=args.endpoint,
-        api_version="2024-12-01-preview"
+    try:
+        return ProposedCodeChangesPydantic(path=match["path"], line=match["line"], change=change.strip("\n"))
+    except ValidationError:
+        return None
+
+def parse_responses(response: str) -> list[ProposedCodeChangesPydantic] | None:
+    """Parse a reply with one or more changes in the prompt's format, one per line
+
+    Returns None unless every part of the reply parses, so the caller can fall back to the LLM.
+    """
+    parts = [part for part in CHANGE_START.split(response.strip()) if part.strip()]
+    changes = [parse_response(part) for part in parts]
+    if not changes or None in changes:
+        return None
+    return changes
+
+def create_client(endpoint: str, api_key: str | None = None) -> AzureOpenAI:
+    """Create an Azure OpenAI client, reading the key from AZURE_OPENAI_API_KEY when none is given"""
+    return AzureOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=API_VERSION
     )
 
+def structure_response(client: AzureOpenAI, model: str, response: str) -> list[ProposedCodeChangesPydantic]:
+    """Extract every proposed code change from an LLM response"""
     completion = client.beta.chat.completions.parse(
-        model=args.model,
+        model=model,
         messages=[
-            {"role": "system", "content": "Extract the information."},
-            {"role": "user", "content": args.response},
+            {"role": "system", "content": "Extract every proposed code change."},
+            {"role": "user", "content": response},
         ],
-        response_format=ProposedCodeChangesPydantic,
+        response_format=ProposedCodeChangeListPydantic,
     )
 
-    structured_output = completion.choices[0].message.content
+    return completion.choices[0].message.parsed.changes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--response", required=True, help="The LLM response to structure")
+    parser.add_argument("--endpoint", required=True, help="The Azure OpenAI Endpoint")
+    parser.add_argument("--model", required=True, help="The Azure OpenAI Model")
+    args = parser.parse_args()
+
+    changes = parse_responses(args.response)
+    source = "parser"
+    if changes is None:
+        changes = structure_response(create_client(args.endpoint), args.model, args.response)
+        source = "llm"
 
-    print(structured_output)
+    print(f"structured by: {source}", file=sys.stderr)
+    print(ProposedCodeChangeListPydantic(changes=changes).model_dump_json())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
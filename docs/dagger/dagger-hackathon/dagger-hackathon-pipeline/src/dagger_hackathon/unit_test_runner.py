@@ -0,0 +1,94 @@
+"""Runs a shard of unittest tests and writes per-test results as JSON.
+
+Used by `RunUnitTests`: once with `--list` to discover the test ids, then once per
+shard with the ids that shard should run. Every result carries the test id, its
+outcome, its duration in seconds and the traceback of a failure or error.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import unittest
+
+
+class JsonTestResult(unittest.TestResult):
+    """Records the outcome, duration and traceback of every test."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self._started = 0.0
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._started = time.perf_counter()
+
+    def record(self, test, outcome, message=""):
+        self.records.append({
+            "id": test.id(),
+            "outcome": outcome,
+            "duration": time.perf_counter() - self._started,
+            "message": message,
+        })
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.record(test, "passed")
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.record(test, "failed", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.record(test, "error", self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.record(test, "skipped", reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self.record(test, "passed")
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self.record(test, "failed", "unexpected success")
+
+
+def iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start-dir", default="tests", help="The directory to discover tests in")
+    parser.add_argument("--output", required=True, help="The JSON file to write the test ids or results to")
+    parser.add_argument("--list", action="store_true", help="Only list the discovered test ids")
+    parser.add_argument("ids", nargs="*", help="The test ids to run")
+    args = parser.parse_args()
+
+    # Import from the working directory like `python -m unittest` does
+    sys.path.insert(0, os.getcwd())
+    # Discover every time, so tests that fail to import still run and report their error
+    tests = list(iter_tests(unittest.TestLoader().discover(args.start_dir)))
+
+    if args.list:
+        output = [test.id() for test in tests]
+    else:
+        wanted = set(args.ids)
+        result = JsonTestResult()
+        unittest.TestSuite([test for test in tests if test.id() in wanted]).run(result)
+        output = result.records
+
+    with open(args.output, "w") as f:
+        json.dump(output, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,561 @@
+import csv
+import hashlib
+import io
+import json
+import re
+import time
+import uuid
+
 import dagger
-from dagger import dag, function, object_type, Doc
+from dagger import dag, field, function, object_type, DefaultPath, Doc
 from typing import Annotated
 
+from pipeline_shared.telemetry import RunTelemetry, telemetry_summaries
+
+TELEMETRY_MODULE = "agent-database-example"
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+# Runs one statement for the agent as PGUSER and caps the rows it gets back
+QUERY_TOOL_SCRIPT = """#!/bin/sh
+psql -h db -d postgres -X -q --csv -v ON_ERROR_STOP=1 -c "$1" | head -n $((${QUERY_MAX_ROWS:-100} + 1))
+"""
+
+# The login the agent's query tool uses. It can read every table through pg_read_all_data
+# and holds no write privilege, so the session settings below are defaults, not the guard.
+READ_ONLY_ROLE = "agent_reader"
+READ_ONLY_ROLE_SQL = """
+SELECT NOT EXISTS (SELECT FROM pg_roles WHERE rolname = :'role') AS missing \\gset
+\\if :missing
+CREATE ROLE :"role";
+\\endif
+ALTER ROLE :"role" WITH LOGIN NOSUPERUSER NOCREATEDB NOCREATEROLE INHERIT PASSWORD :'password';
+GRANT pg_read_all_data TO :"role";
+ALTER ROLE :"role" SET default_transaction_read_only = on;
+ALTER ROLE :"role" SET statement_timeout = '5s';
+"""
+
+QUERY_EXECUTOR_PORT = 8000
+
+POSTGRES_PORT = 5432
+# Outside the image's declared volume, so the restored cluster stays in the container's layers
+SEEDED_PGDATA = "/var/lib/postgresql/seeded"
+
+# Restores a pg_dump archive into a new cluster, then stops the server cleanly. A tar
+# archive extracts to a directory-format archive, which is what lets pg_restore run -j
+# jobs. fsync and full page writes are only off while restoring: a crash here leaves no
+# layer behind to reuse.
+SEED_SCRIPT = """
+set -eu
+mkdir -p /tmp/seed "$PGDATA"
+tar -xf /tmp/seed.tar -C /tmp/seed
+printf '%s' "$POSTGRES_PASSWORD" > /tmp/pwfile
+chown -R postgres:postgres /tmp/seed /tmp/pwfile "$PGDATA"
+
+gosu postgres initdb -D "$PGDATA" -U postgres --pwfile=/tmp/pwfile --auth-local=trust --auth-host=scram-sha-256
+echo "listen_addresses = '*'" >> "$PGDATA/postgresql.conf"
+echo "host all all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
+
+gosu postgres pg_ctl -D "$PGDATA" -w \\
+    -o "-c listen_addresses='' -c fsync=off -c full_page_writes=off -c synchronous_commit=off -c max_wal_size=1GB" start
+gosu postgres pg_restore -U postgres -d postgres -Fd -j "$RESTORE_JOBS" --exit-on-error /tmp/seed
+# describe_tables reads pg_stats, so collect statistics now instead of waiting for autovacuum
+gosu postgres vacuumdb -U postgres -d postgres --analyze-only --jobs "$RESTORE_JOBS"
+gosu postgres pg_ctl -D "$PGDATA" -w -m fast stop
+
+rm -rf /tmp/seed /tmp/seed.tar /tmp/pwfile
+"""
+
+# How OpenAI, Anthropic and Gemini word a prompt that does not fit the model's context window
+CONTEXT_OVERFLOW = re.compile(
+    r"context[_ ]length|maximum context|context window|prompt is too long|input is too long|too many tokens",
+    re.IGNORECASE,
+)
+
+# Fixed questions against dvdrental used to compare prompt strategies
+BENCHMARK_QUESTIONS = [
+    ("staff", "what are the staff names?"),
+    ("customer", "how many customers are inactive?"),
+    ("rental", "which customer has the most rentals?"),
+    ("payment", "what is the largest single payment amount?"),
+]
+
+
+def normalise_question(question: str) -> str:
+    """Lowercase a question and drop extra whitespace and trailing punctuation so rephrasings share a cache entry."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for SQL, rejecting anything that is not a plain identifier."""
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return ".".join(f'"{part}"' for part in name.split("."))
+
+
+@object_type
+class QueryPage:
+    rows: str = field()
+    row_count: int = field()
+    next_cursor: str = field()
+
+
+@object_type
+class AnswerCacheStats:
+    hits: int = field()
+    misses: int = field()
+
+
 @object_type
 class AgentDatabaseExample:
+    def postgres_password(self, password: dagger.Secret | None = None) -> dagger.Secret:
+        """The database password, defaulting to the devcontainer's postgres password."""
+        return password or dag.set_secret("postgres_password", "postgres")
+
     @function
-    async def query_db(
-        self, svc: Annotated[dagger.Service, Doc("Host service")], table_name: str
-    ) -> str:
-        """Send a query to a PostgreSQL service and return the response."""
-        return await (
+    def seeded_postgres(
+        self,
+        seed: Annotated[dagger.File, DefaultPath("/seed_data/dvdrental.tar"), Doc("pg_dump tar archive to restore")],
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+        restore_jobs: Annotated[int, Doc("Parallel pg_restore jobs")] = 4,
+    ) -> dagger.Service:
+        """A Postgres service that starts from an already restored copy of the seed archive.
+
+        The restore runs once, as a build step whose layer the engine keys on the archive's
+        contents. Later sessions start the server on that data directory in seconds, each from
+        a fresh copy, so nothing written in one session leaks into the next. Pass it wherever
+        a function takes `svc`, for example
+        `dagger -c 'ask-agent $(seeded-postgres) staff "what are the staff names?"'`.
+        """
+        return (
+            dag.container()
+            .from_("postgres:16")
+            .with_file("/tmp/seed.tar", seed)
+            .with_env_variable("PGDATA", SEEDED_PGDATA)
+            .with_env_variable("RESTORE_JOBS", str(restore_jobs))
+            .with_secret_variable("POSTGRES_PASSWORD", self.postgres_password(password))
+            .with_exec(["sh", "-c", SEED_SCRIPT])
+            .with_exposed_port(POSTGRES_PORT)
+            .as_service(args=["gosu", "postgres", "postgres", "-D", SEEDED_PGDATA])
+        )
+
+    def psql_base(self, svc: dagger.Service, password: dagger.Secret | None = None) -> dagger.Container:
+        """A postgres client container bound to the database service."""
+        return (
             dag.container()
             .from_("postgres:16")
             .with_service_binding("db", svc)
-            .with_env_variable("PGPASSWORD", "postgres") # handle this better, from .env
+            .with_secret_variable("PGPASSWORD", self.postgres_password(password))
+        )
+
+    def psql(
+        self,
+        svc: dagger.Service,
+        sql: str,
+        variables: dict[str, str] | None = None,
+        csv_output: bool = True,
+        password: dagger.Secret | None = None,
+    ) -> dagger.Container:
+        """Run SQL through psql against the service, reading the statement from stdin so variables are quoted by psql."""
+        args = ["psql", "-h", "db", "-U", "postgres", "-d", "postgres", "-v", "ON_ERROR_STOP=1", "-X", "-q"]
+        # --csv prints a header row and RFC 4180 rows, -At prints bare pipe-separated tuples
+        args += ["--csv"] if csv_output else ["-A", "-t"]
+        for name, value in (variables or {}).items():
+            args += ["-v", f"{name}={value}"]
+
+        return self.psql_base(svc, password).with_exec(args, stdin=sql)
+
+    async def query_tool(
+        self, svc: dagger.Service, max_rows: int = 100, password: dagger.Secret | None = None
+    ) -> dagger.Container:
+        """A container the agent can use to run its own queries.
+
+        It logs in as READ_ONLY_ROLE, which can read every table but not change one, and
+        never sees the admin password. The `query` command returns at most max_rows rows.
+        """
+        admin_password = await self.postgres_password(password).plaintext()
+        # Derived from the admin password, so every caller sets and uses the same one
+        reader_password = hashlib.sha256(f"{READ_ONLY_ROLE}:{admin_password}".encode()).hexdigest()
+        await (
+            self.psql(svc, READ_ONLY_ROLE_SQL, {"role": READ_ONLY_ROLE, "password": reader_password}, password=password)
+            # The service may be a fresh database, so the role is always checked
+            .with_env_variable("ROLE_NONCE", uuid.uuid4().hex)
+            .sync()
+        )
+
+        return (
+            dag.container()
+            .from_("postgres:16")
+            .with_service_binding("db", svc)
+            .with_env_variable("PGUSER", READ_ONLY_ROLE)
+            .with_secret_variable("PGPASSWORD", dag.set_secret(f"{READ_ONLY_ROLE}_password", reader_password))
+            .with_env_variable("QUERY_MAX_ROWS", str(max_rows))
+            .with_new_file("/usr/local/bin/query", QUERY_TOOL_SCRIPT, permissions=0o755)
+        )
+
+    @function
+    def query_executor(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+        pool_size: Annotated[int, Doc("Number of connections kept open")] = 4,
+    ) -> dagger.Service:
+        """A long-lived service that keeps a pool of database connections open and runs batches of queries.
+
+        Identical services are shared for the whole Dagger session, so every query sent
+        through query_batch reuses the same open connections.
+        """
+        return (
+            dag.container()
+            .from_("python:3.12-slim")
+            .with_mounted_cache("/root/.cache/pip", dag.cache_volume("agent-database-pip"))
+            .with_exec(["pip", "install", "psycopg[binary]==3.2.9", "psycopg-pool==3.2.6"])
+            .with_file(
+                "/srv/query_executor.py",
+                dag.current_module().source().file("src/agent_database_example/query_executor.py"),
+            )
+            .with_service_binding("db", svc)
+            .with_env_variable("PGHOST", "db")
+            .with_env_variable("PGUSER", "postgres")
+            .with_env_variable("PGDATABASE", "postgres")
+            .with_secret_variable("PGPASSWORD", self.postgres_password(password))
+            .with_env_variable("POOL_SIZE", str(pool_size))
+            .with_env_variable("PORT", str(QUERY_EXECUTOR_PORT))
+            .with_exposed_port(QUERY_EXECUTOR_PORT)
+            .as_service(args=["python", "/srv/query_executor.py"])
+        )
+
+    def query_executor_client(self, executor: dagger.Service) -> dagger.Container:
+        """A small curl container bound to the query executor."""
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_exec(["apk", "add", "--no-cache", "curl"])
+            .with_service_binding("executor", executor)
+        )
+
+    async def post_batch(self, client: dagger.Container, queries: list[str | dict]) -> list[dict]:
+        """Send queries to the executor in one request and return each result, its `rows` or its `error`."""
+        output = await (
+            client
+            .with_env_variable("BATCH_NONCE", uuid.uuid4().hex)
             .with_exec(
                 [
-                    "psql",
-                    "-h", "db",
-                    "-U", "postgres",
-                    "-d", "postgres",
-                    "-c", "SELECT * FROM {};".format(table_name)
-                ]
+                    "curl", "-sSf", "-X", "POST", "-H", "Content-Type: application/json",
+                    "--data-binary", "@-", f"http://executor:{QUERY_EXECUTOR_PORT}/query",
+                ],
+                stdin=json.dumps({"queries": queries}),
             )
             .stdout()
         )
+        return json.loads(output)["results"]
+
+    async def send_batch(self, client: dagger.Container, queries: list[str]) -> list[str]:
+        """Send queries to the executor in one request and return the CSV result of each."""
+        return [result.get("rows", f"ERROR: {result.get('error')}") for result in await self.post_batch(client, queries)]
+
+    async def read_rows(
+        self,
+        svc: dagger.Service,
+        sql: str,
+        params: dict[str, str] | None = None,
+        password: dagger.Secret | None = None,
+    ) -> str:
+        """Run one read through the pooled executor and return its rows as CSV, as psql --csv prints them.
+
+        Params are bound to `%(name)s` placeholders in the SQL.
+        """
+        [result] = await self.post_batch(
+            self.query_executor_client(self.query_executor(svc, password)),
+            [{"sql": sql, "params": params or {}, "copy": True}],
+        )
+        if "error" in result:
+            raise ValueError(f"Query failed: {result['error']}")
+        return result["rows"]
+
+    @function
+    async def query_batch(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        queries: list[str],
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> list[str]:
+        """Run several queries over one pooled connection and return the CSV result of each."""
+        return await self.send_batch(
+            self.query_executor_client(self.query_executor(svc, password)), queries
+        )
+
     @function
-    async def ask_agent(self, svc: Annotated[dagger.Service, Doc("Host service")], table_name: str, question: str) -> str:
+    async def benchmark_query_latency(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        iterations: int = 20,
+        query: str = "SELECT count(*) FROM rental;",
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """Compare per-query latency of a fresh psql container against the pooled query executor."""
+        client = self.query_executor_client(self.query_executor(svc, password))
+        # Start the executor and open the pool before timing anything
+        await self.send_batch(client, [query])
+
+        timings = {}
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await self.psql(svc, query, password=password).with_env_variable("QUERY_NONCE", uuid.uuid4().hex).stdout()
+        timings["psql container per query"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await self.send_batch(client, [query])
+        timings["pooled executor, one query per request"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await self.send_batch(client, [query] * iterations)
+        timings["pooled executor, one batch"] = time.perf_counter() - start
+
+        return "\n".join(
+            f"{label}: {elapsed / iterations * 1000:.1f} ms/query"
+            for label, elapsed in timings.items()
+        )
+
+    def answer_cache(self) -> dagger.Container:
+        """A container with the persistent answer cache mounted at /answers.
+
+        Reads must always run, so a nonce keeps the engine from replaying an earlier exec.
         """
-        Ask an LLM a question based on a SQL table's contents.
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache("/answers", dag.cache_volume("agent-database-answers"))
+            .with_env_variable("CACHE_NONCE", uuid.uuid4().hex)
+        )
+
+    async def table_fingerprint(
+        self, svc: dagger.Service, tables: list[str], password: dagger.Secret | None = None
+    ) -> str:
+        """A cheap version of the tables built from the pg_stat_user_tables row and modification counters."""
+        names = ",".join(t if "." in t else f"public.{t}" for t in tables)
+        for name in names.split(","):
+            quote_identifier(name)
+
+        return await self.read_rows(
+            svc,
+            "SELECT string_agg(concat_ws(':', schemaname, relname, n_live_tup, n_tup_ins, n_tup_upd, n_tup_del), ',' "
+            "ORDER BY schemaname, relname) FROM pg_stat_user_tables "
+            "WHERE schemaname || '.' || relname = ANY (string_to_array(%(tables)s, ','))",
+            {"tables": names},
+            password,
+        )
+
+    @function
+    async def answer_cache_stats(self) -> AnswerCacheStats:
+        """Return how many ask_agent calls were answered from the cache and how many needed the LLM."""
+        output = await self.answer_cache().with_exec([
+            "sh", "-c",
+            "touch /answers/hits /answers/misses && wc -l < /answers/hits && wc -l < /answers/misses",
+        ]).stdout()
+
+        hits, misses = (int(n) for n in output.split())
+        return AnswerCacheStats(hits=hits, misses=misses)
+
+    def select_sql(
+        self,
+        table_name: str,
+        columns: list[str] | None = None,
+        key_column: str = "",
+        after: str = "",
+        limit: int = 0,
+    ) -> str:
+        """Build a SELECT with optional columns, keyset pagination on key_column and a row limit.
+
+        The cursor is bound to the executor's `%(after)s` placeholder.
+        """
+        columns = list(columns or [])
+        if key_column and columns and key_column not in columns:
+            columns.insert(0, key_column)
+
+        sql = "SELECT {} FROM {}".format(
+            ", ".join(quote_identifier(c) for c in columns) if columns else "*",
+            quote_identifier(table_name),
+        )
+        if key_column:
+            if after:
+                sql += f" WHERE {quote_identifier(key_column)} > %(after)s"
+            sql += f" ORDER BY {quote_identifier(key_column)}"
+        if limit > 0:
+            sql += f" LIMIT {int(limit)}"
+        return sql + ";"
+
+    @function
+    async def query_db(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        table_name: str,
+        columns: Annotated[list[str] | None, Doc("Columns to select, all when empty")] = None,
+        limit: Annotated[int, Doc("Maximum number of rows, unlimited when 0")] = 0,
+        csv_output: Annotated[bool, Doc("Return CSV with a header instead of unaligned tuples")] = True,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """Send a query to a PostgreSQL service and return the response.
+
+        CSV reads go through the pooled query executor. Unaligned tuples are psql's own format,
+        so they still take a psql container.
+        """
+        sql = self.select_sql(table_name, columns, limit=limit)
+        if csv_output:
+            return await self.read_rows(svc, sql, password=password)
+        return await self.psql(svc, sql, csv_output=False, password=password).stdout()
+
+    @function
+    async def query_page(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        table_name: str,
+        key_column: Annotated[str, Doc("Unique, ordered column used as the keyset cursor")],
+        columns: Annotated[list[str] | None, Doc("Columns to select, all when empty")] = None,
+        after: Annotated[str, Doc("Return rows whose key is greater than this cursor")] = "",
+        limit: Annotated[int, Doc("Rows per page")] = 500,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> QueryPage:
+        """Return one keyset-paginated page of a table as CSV, with the cursor for the next page.
+
+        This is the paging API for large tables: pass each page's next_cursor as `after` until
+        it comes back empty, so no caller holds the whole table at once.
+        """
+        params = {"after": after} if after else None
+        output = await self.read_rows(
+            svc, self.select_sql(table_name, columns, key_column, after, limit), params, password
+        )
+
+        records = list(csv.reader(io.StringIO(output)))
+        header, rows = (records[0], records[1:]) if records else ([], [])
+        next_cursor = ""
+        if rows and len(rows) == limit:
+            next_cursor = rows[-1][header.index(key_column)]
+
+        return QueryPage(rows=output, row_count=len(rows), next_cursor=next_cursor)
+
+    def describe_sql(self, table_name: str, sample_rows: int = 10) -> str:
+        """psql script that summarises one table from information_schema and pg_stats."""
+        quoted = quote_identifier(table_name)
+        schema, _, table = table_name.rpartition(".")
+        return f"""
+        \\set schema '{schema or "public"}'
+        \\set table '{table}'
+        \\echo '## table {table_name}'
+        \\echo '# columns'
+        SELECT column_name, data_type, is_nullable
+        FROM information_schema.columns
+        WHERE table_schema = :'schema' AND table_name = :'table'
+        ORDER BY ordinal_position;
+        \\echo '# foreign keys'
+        SELECT kcu.column_name, ccu.table_name AS references_table, ccu.column_name AS references_column
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+            ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+        JOIN information_schema.constraint_column_usage ccu
+            ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.table_schema
+        WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_schema = :'schema' AND tc.table_name = :'table';
+        \\echo '# row count'
+        SELECT n_live_tup AS estimated_rows
+        FROM pg_stat_user_tables
+        WHERE schemaname = :'schema' AND relname = :'table';
+        \\echo '# column statistics'
+        SELECT attname AS column_name, null_frac, n_distinct,
+            left(most_common_vals::text, 200) AS most_common_values,
+            left(histogram_bounds::text, 200) AS histogram_bounds
+        FROM pg_stats
+        WHERE schemaname = :'schema' AND tablename = :'table';
+        \\echo '# sample rows'
+        SELECT * FROM {quoted} LIMIT {int(sample_rows)};
+        """
+
+    @function
+    async def describe_table(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        table_name: str,
+        sample_rows: Annotated[int, Doc("Number of sample rows to include")] = 10,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """Summarise a table from information_schema and pg_stats instead of dumping its rows."""
+        return await self.describe_tables(svc, [table_name], sample_rows, password)
+
+    @function
+    async def describe_tables(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        tables: list[str],
+        sample_rows: Annotated[int, Doc("Number of sample rows to include per table")] = 10,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """Summarise several tables in a single psql session, one container and one connection for all of them."""
+        sql = "".join(self.describe_sql(table_name, sample_rows) for table_name in tables)
+        return await self.psql(svc, sql, password=password).stdout()
+
+    @function
+    async def list_tables(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        schema: str = "public",
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> list[str]:
+        """List the base tables in a schema."""
+        output = await self.read_rows(
+            svc,
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = %(schema)s AND table_type = 'BASE TABLE' ORDER BY table_name",
+            {"schema": schema},
+            password,
+        )
+
+        prefix = "" if schema == "public" else f"{schema}."
+        return [f"{prefix}{name}" for [name] in list(csv.reader(io.StringIO(output)))[1:]]
+
+    async def context_llm(
+        self, svc: dagger.Service, tables: list[str], question: str, password: dagger.Secret | None = None
+    ) -> dagger.LLM:
+        """An LLM primed with the table summaries and a read-only query tool."""
+        table_context = await self.describe_tables(svc, tables, password=password)
+
+        environment = (
+            dag.env()
+            .with_string_input("question", question, "the question to answer")
+            .with_container_input(
+                "database",
+                await self.query_tool(svc, password=password),
+                "a read-only postgres client, run `query \"<sql>\"` to fetch specific rows as CSV",
+            )
+            .with_string_output("answer", "the answer to the question")
+        )
+
+        prompt = f"""
+        You are an expert database administrator.
+        You have been given the schema, foreign keys, statistics and a sample of these SQL tables: {", ".join(tables)}
+        {table_context}
+
+        If the summary is not enough, use the `query` command in the database container to
+        fetch only the rows or aggregates you need, joining tables where the question spans
+        several of them. Do not select whole tables.
+
+        Given the information above, answer the following question:
+
+        The question is: {question}
+
+        DO NOT STOP UNTIL YOU HAVE ANSWERED THE QUESTION COMPLETELY.
         """
-        table_contents = await self.query_db(svc, table_name)
+
+        return dag.llm().with_env(environment).with_prompt(prompt)
+
+    async def full_table_llm(
+        self, svc: dagger.Service, table_name: str, question: str, password: dagger.Secret | None = None
+    ) -> dagger.LLM:
+        """An LLM given the whole table in its prompt, the original approach kept for comparison."""
+        table_contents = await self.query_db(svc, table_name, password=password)
 
         prompt = f"""
         You are an expert database administrator.
-        You have been given the contents of a SQL table:
+        You have been given the contents of a SQL table as CSV:
         {str(table_contents)}
 
         Given the contents above, answer the following question:
@@ -44,8 +565,135 @@ class AgentDatabaseExample:
         DO NOT STOP UNTIL YOU HAVE ANSWERED THE QUESTION COMPLETELY.
         """
 
-        return await (
-            dag.llm()
-            .with_prompt(prompt)
-            .last_reply()
-        )
\ No newline at end of file
+        return dag.llm().with_prompt(prompt)
+
+    @function
+    async def ask_agent(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        table_name: str,
+        question: str,
+        use_cache: Annotated[bool, Doc("Reuse an earlier answer while the table is unchanged")] = True,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """
+        Ask an LLM a question based on a SQL table's schema, statistics and sample rows.
+        """
+        return await self.ask_agent_tables(svc, question, [table_name], use_cache=use_cache, password=password)
+
+    @function
+    async def ask_agent_tables(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        question: str,
+        tables: Annotated[list[str] | None, Doc("Tables the question is about")] = None,
+        schema: Annotated[str, Doc("Use every table in this schema when no tables are given")] = "public",
+        use_cache: Annotated[bool, Doc("Reuse an earlier answer while the tables are unchanged")] = True,
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """
+        Ask an LLM a question that spans several tables, in a single LLM call.
+
+        Answers are cached per normalised question, tables and table fingerprint. A change to
+        any of the tables changes the fingerprint, and the stale answer is replaced on the next miss.
+        """
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "ask-agent")
+        try:
+            if not tables:
+                async with telemetry.step("list tables"):
+                    tables = await self.list_tables(svc, schema, password)
+
+            async def ask() -> str:
+                async with telemetry.step("agent", kind="llm", tables=len(tables)) as record:
+                    # Evaluate once, the reply and token usage then come from the same run
+                    llm = await (await self.context_llm(svc, tables, question, password)).sync()
+                    answer = await llm.last_reply()
+                    usage = llm.token_usage()
+                    record.update(input_tokens=await usage.input_tokens(), output_tokens=await usage.output_tokens())
+                return answer
+
+            if not use_cache:
+                return await ask()
+
+            async with telemetry.step("answer cache lookup", kind="cache") as record:
+                question_key = hashlib.sha256(
+                    "\n".join([normalise_question(question), *sorted(tables)]).encode()
+                ).hexdigest()
+                fingerprint_key = hashlib.sha256(
+                    (await self.table_fingerprint(svc, tables, password)).encode()
+                ).hexdigest()
+
+                lookup = (
+                    self.answer_cache()
+                    .with_env_variable("ENTRY", f"/answers/{question_key}/{fingerprint_key}")
+                    .with_exec(
+                        [
+                            "sh", "-c",
+                            'if [ -f "$ENTRY" ]; then echo >> /answers/hits; cat "$ENTRY"; '
+                            "else echo >> /answers/misses; exit 1; fi",
+                        ],
+                        expect=dagger.ReturnType.ANY,
+                    )
+                )
+                record["cached"] = await lookup.exit_code() == 0
+
+            if record["cached"]:
+                return await lookup.stdout()
+
+            answer = await ask()
+
+            # Only one fingerprint is kept per question, older answers are stale by definition
+            async with telemetry.step("answer cache store", kind="cache"):
+                await (
+                    self.answer_cache()
+                    .with_env_variable("DIR", f"/answers/{question_key}")
+                    .with_env_variable("ENTRY", f"/answers/{question_key}/{fingerprint_key}")
+                    .with_exec(["sh", "-c", 'mkdir -p "$DIR" && rm -f "$DIR"/* && cat > "$ENTRY"'], stdin=answer)
+                    .sync()
+                )
+            return answer
+        finally:
+            await telemetry.save()
+
+    @function
+    async def benchmark_ask_agent(
+        self,
+        svc: Annotated[dagger.Service, Doc("Host service")],
+        password: Annotated[dagger.Secret | None, Doc("Postgres password")] = None,
+    ) -> str:
+        """Compare input tokens and end-to-end latency of full-table prompts and summarised context."""
+        lines = ["table | question | mode | input tokens | seconds"]
+        for table_name, question in BENCHMARK_QUESTIONS:
+            for mode in ["full table", "context"]:
+                start = time.perf_counter()
+                if mode == "full table":
+                    llm = await self.full_table_llm(svc, table_name, question, password)
+                else:
+                    llm = await self.context_llm(svc, [table_name], question, password)
+                try:
+                    llm = await llm.sync()
+                except dagger.QueryError as e:
+                    # Large tables do not fit in the model's context window, any other error is real
+                    if not CONTEXT_OVERFLOW.search(str(e)):
+                        raise
+                    elapsed = time.perf_counter() - start
+                    overflow = "context overflow"
+                    if mode == "full table":
+                        table_chars = len(await self.query_db(svc, table_name, password=password))
+                        overflow += f", ~{table_chars // 4} table tokens"
+                    lines.append(f"{table_name} | {question} | {mode} | {overflow} | {elapsed:.2f}")
+                    continue
+                elapsed = time.perf_counter() - start
+                tokens = await llm.token_usage().input_tokens()
+                lines.append(f"{table_name} | {question} | {mode} | {tokens} | {elapsed:.2f}")
+
+        return "\n".join(lines)
+
+    @function
+    def telemetry_summaries(self) -> dagger.Directory:
+        """Returns the JSON telemetry summaries of this module's past runs.
+
+        Each summary lists every step's duration, whether it was cached or only likely cached, and the LLM tokens it used.
+        Export them with `dagger call telemetry-summaries export --path ./telemetry`.
+        """
+        return telemetry_summaries(TELEMETRY_MODULE)
@@ -0,0 +1,78 @@
+"""Long-lived query executor for the database agent.
+
+Keeps a pool of open PostgreSQL connections and runs batches of queries sent as
+JSON over HTTP, so callers skip the container start, TCP and auth handshake that a
+fresh psql process pays on every query. Connection settings come from the standard
+libpq environment variables (PGHOST, PGUSER, PGDATABASE, PGPASSWORD).
+
+A query is either SQL text or an object with `sql`, optional `params` bound to its
+`%(name)s` placeholders, and `copy`. With `copy` the rows are read through
+`COPY ... TO STDOUT`, so values are rendered as Postgres prints them, the same as
+`psql --csv` does.
+"""
+import csv
+import io
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from psycopg_pool import ConnectionPool
+
+pool = ConnectionPool(
+    "",
+    min_size=1,
+    max_size=int(os.environ.get("POOL_SIZE", "4")),
+    kwargs={"autocommit": True},
+    open=False,
+)
+
+
+def run_query(conn, query: str | dict) -> dict:
+    """Run one statement and return its rows as CSV, or the error message."""
+    if isinstance(query, str):
+        query = {"sql": query}
+    sql, params = query["sql"], query.get("params") or None
+
+    try:
+        with conn.cursor() as cur:
+            if query.get("copy"):
+                statement = f"COPY ({sql.strip().rstrip(';')}) TO STDOUT WITH (FORMAT csv, HEADER)"
+                with cur.copy(statement, params) as copy:
+                    return {"rows": b"".join(copy).decode()}
+
+            cur.execute(sql, params)
+            out = io.StringIO()
+            if cur.description:
+                writer = csv.writer(out)
+                writer.writerow([column.name for column in cur.description])
+                writer.writerows(cur.fetchall())
+            return {"rows": out.getvalue()}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/query":
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with pool.connection() as conn:
+            results = [run_query(conn, query) for query in body["queries"]]
+
+        payload = json.dumps({"results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    pool.open(wait=True)
+    ThreadingHTTPServer(("0.0.0.0", int(os.environ.get("PORT", "8000"))), QueryHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Helpers shared by the example Dagger modules.
+
+Each module depends on this package through a uv path source and includes its
+directory in dagger.json, so a fix made here reaches every module.
+"""
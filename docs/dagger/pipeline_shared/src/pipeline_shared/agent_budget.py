@@ -0,0 +1,145 @@
+"""Run an LLM agent within a budget of tool calls, tokens and wall time.
+
+The agent works in rounds: it makes a few tool calls, then replies with its progress,
+or with its final answer prefixed by FINAL_MARKER. The budget is checked between
+rounds. The run stops early when the tool calls, tokens or deadline run out, or when
+the agent keeps repeating an identical command.
+
+Two hard limits also apply inside a round. The engine's `max_api_calls` caps model
+requests, see `AgentBudget.max_api_calls`, and the deadline cancels a round that is
+still running. In every case the reply of the last completed round is returned as
+the partial result, together with the reason the run stopped.
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import dagger
+
+FINAL_MARKER = "FINAL ANSWER:"
+
+BUDGET_INSTRUCTIONS = (
+    "Work in rounds of at most {round_tool_calls} tool calls. After each round, stop and reply "
+    "with a short summary of your progress so far. When the assignment is complete, reply with "
+    f'your final answer and start it with "{FINAL_MARKER}".'
+)
+CONTINUE_PROMPT = "Continue with the next round."
+
+
+@dataclass
+class AgentBudget:
+    max_tool_calls: int = 20
+    max_tokens: int = 200_000
+    deadline_seconds: float = 300.0
+    # How often one identical command may run before the agent is considered stuck
+    max_repeated_commands: int = 2
+    round_tool_calls: int = 5
+
+    @property
+    def max_api_calls(self) -> int:
+        """Engine-enforced model requests: one per tool call plus one reply per round, with slack."""
+        rounds = -(-self.max_tool_calls // self.round_tool_calls)
+        return self.max_tool_calls + rounds + 2
+
+
+@dataclass
+class BudgetedRun:
+    reply: str
+    # "completed", or "budget_exhausted" with the reason in `reason`
+    status: str
+    reason: str
+    rounds: int
+    tool_calls: int
+    input_tokens: int
+    output_tokens: int
+    duration_seconds: float
+
+    def render(self) -> str:
+        """The reply, headed by the stop reason when the budget ran out."""
+        if self.status == "completed":
+            return self.reply
+        reply = self.reply or "No round completed before the budget ran out."
+        return f"[{self.status}: {self.reason}]\n{reply}"
+
+
+def tool_calls(history_json: str) -> list[str]:
+    """Every tool call in an LLM's history, rendered as `name(arguments)`."""
+    calls = []
+    for message in json.loads(history_json or "[]"):
+        for call in message.get("tool_calls") or []:
+            function = call.get("function", call)
+            calls.append(f"{function.get('name')}({function.get('arguments')})")
+    return calls
+
+
+def most_repeated(calls: list[str]) -> tuple[str, int]:
+    if not calls:
+        return "", 0
+    return Counter(calls).most_common(1)[0]
+
+
+async def run_with_budget(llm: dagger.LLM, budget: AgentBudget) -> BudgetedRun:
+    """Run an agent round by round until it gives a final answer or the budget runs out.
+
+    Create the LLM with `dag.llm(max_api_calls=budget.max_api_calls)` so the engine
+    enforces the hard cap.
+    """
+    start = time.perf_counter()
+    llm = llm.with_prompt(BUDGET_INSTRUCTIONS.format(round_tool_calls=budget.round_tool_calls))
+    reply, reason = "", ""
+    rounds, calls, input_tokens, output_tokens = 0, [], 0, 0
+
+    while True:
+        remaining = budget.deadline_seconds - (time.perf_counter() - start)
+        if remaining <= 0:
+            reason = "deadline"
+            break
+        try:
+            llm = await asyncio.wait_for(llm.sync(), remaining)
+        except asyncio.TimeoutError:
+            reason = "deadline"
+            break
+        except dagger.QueryError as e:
+            if "limit" not in str(e).lower():
+                raise
+            reason = "max_api_calls"
+            break
+
+        rounds += 1
+        calls_before = len(calls)
+        reply = await llm.last_reply()
+        calls = tool_calls(await llm.history_json())
+        usage = llm.token_usage()
+        input_tokens, output_tokens = await usage.input_tokens(), await usage.output_tokens()
+
+        if reply.lstrip().startswith(FINAL_MARKER):
+            reply = reply.lstrip()[len(FINAL_MARKER):].strip()
+            break
+        # A round without tool calls is the agent answering, whether or not it used the marker
+        if len(calls) == calls_before:
+            break
+        if len(calls) >= budget.max_tool_calls:
+            reason = "max_tool_calls"
+            break
+        if input_tokens + output_tokens >= budget.max_tokens:
+            reason = "max_tokens"
+            break
+        command, count = most_repeated(calls)
+        if count > budget.max_repeated_commands:
+            reason = f"repeated command: {command}"
+            break
+
+        llm = llm.with_prompt(CONTINUE_PROMPT)
+
+    return BudgetedRun(
+        reply=reply,
+        status="budget_exhausted" if reason else "completed",
+        reason=reason,
+        rounds=rounds,
+        tool_calls=len(calls),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        duration_seconds=time.perf_counter() - start,
+    )
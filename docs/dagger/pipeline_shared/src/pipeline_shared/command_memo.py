@@ -0,0 +1,133 @@
+"""Memoise read-only commands that an agent runs through its container tools.
+
+The engine only reuses an exec when the container is identical. An agent usually
+runs each command on the container its previous command returned, so repeating
+`databricks jobs list` or `python -m unittest` runs the command again even though
+nothing it depends on has changed.
+
+`memoise_commands` puts a wrapper for a command in front of the real binary. Read-only
+invocations, matched by a regex on the arguments, are keyed on the arguments, the
+working directory, the environment and a hash of the files under `state_dir` and of the
+command's config files. A repeat with the same key replays the recorded stdout and
+stderr. Only successful runs are recorded, so a failure such as a network error is
+retried. Any other invocation of the command is treated as mutating: it clears the
+command's memo and then runs.
+
+All sessions share the `agent-command-memo` cache volume, each in its own `/memo/<session>`
+directory. Results are shared by every container the agent derives in that session. No
+later session reads them, so remote state such as job lists is always fetched afresh by
+the next session. Call `clear_memo` when the agent run ends to delete the session's
+directory, the engine cannot delete a cache volume from a module.
+"""
+import uuid
+
+import dagger
+from dagger import dag
+
+from .telemetry import ALPINE_IMAGE
+
+MEMO_VOLUME = "agent-command-memo"
+MEMO_BIN = "/usr/local/memo-bin"
+MEMO_DIR = "/memo"
+
+MEMO_WRAPPER = r"""#!/bin/sh
+# Memoising wrapper for {command}, see command_memo.py
+real=$(PATH="${{PATH#{memo_bin}:}}" command -v {command})
+args=" $* "
+mkdir -p {memo_dir}
+if ! printf '%s' "$args" | grep -Eq '^ ({read_only})( |$)'; then
+    rm -f {memo_dir}/{command}-*
+    exec "$real" "$@"
+fi
+
+state=$(
+    {{
+        find {state_dir} -type f -not -path '*/__pycache__/*' -not -path '*/.git/*' -exec sha256sum {{}} + 2>/dev/null
+        sha256sum {config_files} 2>/dev/null
+        env | grep -v '^_=' | sha256sum
+    }} | sort | sha256sum | cut -c1-16
+)
+entry={memo_dir}/{command}-$(printf '%s\n%s\n%s' "$state" "$PWD" "$args" | sha256sum | cut -c1-32)
+if [ -f "$entry.ok" ]; then
+    echo >> {memo_dir}/hits
+    cat "$entry.out"
+    cat "$entry.err" >&2
+    exit 0
+fi
+
+echo >> {memo_dir}/misses
+"$real" "$@" > "$entry.out" 2> "$entry.err"
+status=$?
+cat "$entry.out"
+cat "$entry.err" >&2
+if [ "$status" -eq 0 ]; then
+    # Written last, so a half-recorded entry is never replayed
+    touch "$entry.ok"
+else
+    rm -f "$entry.out" "$entry.err"
+fi
+exit "$status"
+"""
+
+
+def memo_session() -> str:
+    """A new memo session id, use one per agent run."""
+    return uuid.uuid4().hex[:16]
+
+
+def memoise_commands(
+    container: dagger.Container,
+    commands: dict[str, str],
+    state_dir: str,
+    session: str,
+    config_files: tuple[str, ...] = (),
+) -> dagger.Container:
+    """Wrap commands so their read-only invocations are memoised for one agent session.
+
+    `commands` maps each command name to a regex matching its read-only arguments.
+    `config_files` are the paths of files the commands read their settings from, such as
+    the CLI's credentials. A change to any of them invalidates the memo.
+    """
+    container = container.with_mounted_cache(MEMO_DIR, dag.cache_volume(MEMO_VOLUME))
+    for command, read_only in commands.items():
+        container = container.with_new_file(
+            f"{MEMO_BIN}/{command}",
+            MEMO_WRAPPER.format(
+                command=command,
+                read_only=read_only,
+                state_dir=state_dir,
+                config_files=" ".join(config_files) or "/dev/null",
+                memo_bin=MEMO_BIN,
+                memo_dir=f"{MEMO_DIR}/{session}",
+            ),
+            permissions=0o755,
+        )
+    return container.with_env_variable("PATH", f"{MEMO_BIN}:$PATH", expand=True)
+
+
+async def memo_stats(container: dagger.Container, session: str) -> tuple[int, int]:
+    """Count the memo hits and misses recorded in a session so far."""
+    memo_dir = f"{MEMO_DIR}/{session}"
+    counts = await (
+        container
+        .with_env_variable("MEMO_NONCE", uuid.uuid4().hex)
+        .with_exec([
+            "sh", "-c",
+            f"cat {memo_dir}/hits 2>/dev/null | wc -l; cat {memo_dir}/misses 2>/dev/null | wc -l",
+        ])
+        .stdout()
+    )
+    hits, misses = (int(n) for n in counts.split())
+    return hits, misses
+
+
+async def clear_memo(session: str) -> None:
+    """Delete a session's memo from the shared volume, call it when the agent run ends."""
+    await (
+        dag.container()
+        .from_(ALPINE_IMAGE)
+        .with_mounted_cache(MEMO_DIR, dag.cache_volume(MEMO_VOLUME))
+        .with_env_variable("MEMO_NONCE", uuid.uuid4().hex)
+        .with_exec(["rm", "-rf", f"{MEMO_DIR}/{session}"])
+        .sync()
+    )
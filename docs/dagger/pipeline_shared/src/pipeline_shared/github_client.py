@@ -0,0 +1,164 @@
+"""Lightweight async client for the GitHub REST API.
+
+Runs in-process instead of building a container with the gh CLI for every call.
+One client keeps its HTTP connections open across requests, sends ETag-conditional
+GETs so unchanged resources come back as a free 304, and retries when GitHub
+reports a rate limit, or a server error on a GET. Point `base_url` at a local mock
+server to test without network access.
+
+A Dagger function call runs in its own process, so `shared_client` hands every helper
+in that call the same client, connection pool and ETag cache.
+"""
+import asyncio
+import functools
+import time
+from typing import Any
+
+import httpx
+
+GITHUB_API_URL = "https://api.github.com"
+# GitHub may have applied a write before failing with one of these, so only GETs retry them
+SERVER_ERROR_STATUS_CODES = {500, 502, 503, 504}
+
+
+class GitHubClient:
+    def __init__(
+        self,
+        token: str,
+        base_url: str = GITHUB_API_URL,
+        max_retries: int = 3,
+        max_retry_wait: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self._etags: dict[str, tuple[str, Any]] = {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": "2022-11-28",
+            },
+            timeout=30.0,
+        )
+
+    async def __aenter__(self) -> "GitHubClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> float | None:
+        """Seconds to wait before retrying, or None when the response should not be retried.
+
+        Rate-limited requests are rejected before GitHub does anything, so every method retries
+        them. Server errors are only retried for GETs, a POST may already have been applied.
+        """
+        rate_limited = response.status_code == 429 or (
+            response.status_code == 403 and response.headers.get("x-ratelimit-remaining") == "0"
+        )
+        server_error = response.status_code in SERVER_ERROR_STATUS_CODES
+        if not rate_limited and not (server_error and response.request.method == "GET"):
+            return None
+
+        if "retry-after" in response.headers:
+            delay = float(response.headers["retry-after"])
+        elif rate_limited and "x-ratelimit-reset" in response.headers:
+            delay = float(response.headers["x-ratelimit-reset"]) - time.time()
+        else:
+            delay = 2.0 ** attempt
+        return min(max(delay, 0.0), self.max_retry_wait)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: dict[str, Any] | None = None,
+        json: Any = None,
+    ) -> Any:
+        """Send a request and return the decoded JSON body.
+
+        GET responses are cached by ETag and revalidated with If-None-Match. Rate-limited
+        responses, and 5xx responses to GETs, are retried with the wait GitHub asks for, or
+        exponential backoff.
+        """
+        cache_key = f"{path}?{sorted((params or {}).items())}" if method == "GET" else ""
+        headers = {}
+        if cache_key in self._etags:
+            headers["If-None-Match"] = self._etags[cache_key][0]
+
+        for attempt in range(self.max_retries + 1):
+            response = await self._client.request(method, path, params=params, json=json, headers=headers)
+            if response.status_code == 304 and cache_key in self._etags:
+                return self._etags[cache_key][1]
+
+            delay = self.retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                break
+            await asyncio.sleep(delay)
+
+        response.raise_for_status()
+        body = response.json() if response.content else None
+        if cache_key and "etag" in response.headers:
+            self._etags[cache_key] = (response.headers["etag"], body)
+        return body
+
+    async def find_pull_request(self, repo: str, branch: str) -> dict:
+        """Return the open pull request whose head is the given branch."""
+        owner = repo.split("/")[0]
+        pulls = await self.request(
+            "GET", f"/repos/{repo}/pulls", params={"head": f"{owner}:{branch}", "state": "open", "per_page": 1}
+        )
+        if not pulls:
+            raise ValueError(f"No open pull request for branch {branch} in {repo}")
+        return pulls[0]
+
+    async def latest_pull_request_by_viewer(self, repo: str) -> dict:
+        """Return the most recently created open pull request authored by the token's user."""
+        login = (await self.request("GET", "/user"))["login"]
+        pulls = await self.request(
+            "GET",
+            f"/repos/{repo}/pulls",
+            params={"state": "open", "sort": "created", "direction": "desc", "per_page": 100},
+        )
+        for pull in pulls:
+            if pull["user"]["login"] == login:
+                return pull
+        raise ValueError(f"No open pull request by {login} in {repo}")
+
+    async def create_issue_comment(self, repo: str, number: int, body: str) -> dict:
+        """Post a comment on the conversation tab of a pull request or issue."""
+        return await self.request("POST", f"/repos/{repo}/issues/{number}/comments", json={"body": body})
+
+    async def create_review(
+        self,
+        repo: str,
+        number: int,
+        commit_id: str,
+        comments: list[dict],
+        body: str = "",
+        event: str = "COMMENT",
+    ) -> dict:
+        """Submit one pull request review carrying many line comments in a single API call.
+
+        Each comment is a dict with `path`, `line`, `body` and optionally `side`.
+        """
+        return await self.request(
+            "POST",
+            f"/repos/{repo}/pulls/{number}/reviews",
+            json={
+                "commit_id": commit_id,
+                "body": body,
+                "event": event,
+                "comments": [{"side": "RIGHT", **comment} for comment in comments],
+            },
+        )
+
+
+@functools.cache
+def shared_client(token: str, base_url: str = GITHUB_API_URL) -> GitHubClient:
+    """The process-wide client for one token and API URL, left open until the process exits."""
+    return GitHubClient(token, base_url)
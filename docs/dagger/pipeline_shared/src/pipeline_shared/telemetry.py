@@ -0,0 +1,123 @@
+"""Per-run telemetry for pipeline steps: durations, cache hits and LLM token usage.
+
+Each step runs inside an OpenTelemetry span, which the Dagger SDK exports into the
+same trace as the engine's own spans. The same numbers are collected into a JSON
+summary per run and stored in the `pipeline-telemetry` cache volume, so the hot
+spots of many runs can be exported and ranked.
+
+The SDK does not expose whether the engine served an exec from its cache. Callers
+that know it, for example from a command's output, record `cached` themselves.
+`exec_step` can only guess from the step finishing in under `CACHED_STEP_SECONDS`,
+so it records `likely_cached` instead, and the summary counts the two apart.
+"""
+import contextlib
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+import dagger
+from dagger import dag
+from opentelemetry import trace
+
+TELEMETRY_CACHE = "pipeline-telemetry"
+TELEMETRY_PATH = "/telemetry"
+CACHED_STEP_SECONDS = 0.5
+ALPINE_IMAGE = "alpine:3.21"
+
+tracer = trace.get_tracer(__name__)
+
+
+class RunTelemetry:
+    def __init__(self, module: str, run: str):
+        self.module = module
+        self.run = run
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}"
+        self.steps: list[dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    @contextlib.asynccontextmanager
+    async def step(self, name: str, **attributes: Any) -> AsyncIterator[dict[str, Any]]:
+        """Time a step in its own span.
+
+        Yields the step's record, callers add attributes such as `cached` or token counts to it.
+        Only set `cached` from a definite signal, never from timing.
+        """
+        record: dict[str, Any] = {"name": name, **attributes}
+        with tracer.start_as_current_span(f"{self.run}: {name}") as span:
+            start = time.perf_counter()
+            try:
+                yield record
+            except Exception as e:
+                record["error"] = type(e).__name__
+                raise
+            finally:
+                record["duration_seconds"] = time.perf_counter() - start
+                self.steps.append(record)
+                for key, value in record.items():
+                    if isinstance(value, (bool, int, float, str)):
+                        span.set_attribute(f"pipeline.{key}", value)
+
+    async def exec_step(self, name: str, container: dagger.Container) -> dagger.Container:
+        """Evaluate a container's pending execs as one step and return the evaluated container."""
+        async with self.step(name, kind="exec") as record:
+            start = time.perf_counter()
+            container = await container.sync()
+            # A guess from timing, a fast uncached exec counts as a hit too
+            record["likely_cached"] = time.perf_counter() - start < CACHED_STEP_SECONDS
+        return container
+
+    def summary(self) -> dict[str, Any]:
+        """The run's steps, totals and its slowest steps first."""
+        cacheable = [step for step in self.steps if "cached" in step]
+        cache_hits = sum(bool(step["cached"]) for step in cacheable)
+        likely_cacheable = [step for step in self.steps if "likely_cached" in step]
+        likely_cache_hits = sum(bool(step["likely_cached"]) for step in likely_cacheable)
+        return {
+            "module": self.module,
+            "run": self.run,
+            "run_id": self.run_id,
+            "duration_seconds": time.perf_counter() - self._started,
+            "steps": self.steps,
+            "totals": {
+                "steps": len(self.steps),
+                "cache_hits": cache_hits,
+                "cache_hit_rate": cache_hits / len(cacheable) if cacheable else 0.0,
+                "likely_cache_hits": likely_cache_hits,
+                "likely_cache_hit_rate": likely_cache_hits / len(likely_cacheable) if likely_cacheable else 0.0,
+                "input_tokens": sum(step.get("input_tokens", 0) for step in self.steps),
+                "output_tokens": sum(step.get("output_tokens", 0) for step in self.steps),
+            },
+            "hot_spots": [
+                {"name": step["name"], "duration_seconds": step["duration_seconds"]}
+                for step in sorted(self.steps, key=lambda step: step["duration_seconds"], reverse=True)[:5]
+            ],
+        }
+
+    async def save(self) -> str:
+        """Store the run's JSON summary in the telemetry cache volume and return it."""
+        summary = json.dumps(self.summary(), indent=2)
+        path = f"{TELEMETRY_PATH}/{self.module}/{self.run}-{self.run_id}.json"
+        await (
+            dag.container()
+            .from_(ALPINE_IMAGE)
+            .with_mounted_cache(TELEMETRY_PATH, dag.cache_volume(TELEMETRY_CACHE))
+            .with_new_file("/tmp/summary.json", summary)
+            .with_exec(["sh", "-c", f'mkdir -p "$(dirname {path})" && cp /tmp/summary.json {path}'])
+            .sync()
+        )
+        return summary
+
+
+def telemetry_summaries(module: str) -> dagger.Directory:
+    """Copy a module's stored run summaries out of the telemetry cache volume."""
+    return (
+        dag.container()
+        .from_(ALPINE_IMAGE)
+        .with_mounted_cache(TELEMETRY_PATH, dag.cache_volume(TELEMETRY_CACHE))
+        # Always copy the volume's current contents
+        .with_env_variable("COPY_NONCE", uuid.uuid4().hex)
+        .with_exec(["sh", "-c", f"mkdir -p /out {TELEMETRY_PATH}/{module} && cp -r {TELEMETRY_PATH}/{module}/. /out/"])
+        .directory("/out")
+    )
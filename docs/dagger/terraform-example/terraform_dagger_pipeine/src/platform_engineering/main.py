@@ -1,6 +1,64 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
 from typing import Annotated
 import dagger
-from dagger import dag, function, object_type, Doc, Secret
+from dagger import dag, field, function, object_type, Doc, Secret
+
+from pipeline_shared.telemetry import RunTelemetry, telemetry_summaries
+
+TELEMETRY_MODULE = "platform-engineering"
+# Blocks that only appear in a root module, not in a reusable child module
+ROOT_MODULE_BLOCK = re.compile(r'^\s*(provider|backend)\s+"', re.MULTILINE)
+# Blocks that decide what `terraform init` writes to .terraform: the backend and the modules
+INIT_CONFIG_BLOCK = re.compile(r'^\s*(terraform|module\s+"[^"]*")\s*\{', re.MULTILINE)
+PLAN_SUMMARY = re.compile(r"Plan: (\d+) to add, (\d+) to change, (\d+) to destroy")
+PLUGIN_CACHE_DIR = "/root/.terraform.d/plugin-cache"
+PLAN_FILE_PATH = "/tmp/tfplan"
+PLAN_JSON_PATH = "/tmp/tfplan.json"
+
+
+def init_config_blocks(content: str) -> str:
+    """Returns the `terraform` and `module` blocks of a .tf file."""
+    blocks = []
+    for match in INIT_CONFIG_BLOCK.finditer(content):
+        depth = 0
+        for end in range(match.end() - 1, len(content)):
+            depth += {"{": 1, "}": -1}.get(content[end], 0)
+            if depth == 0:
+                break
+        blocks.append(content[match.start():end + 1])
+    return "\n".join(blocks)
+
+
+@object_type
+class TerraformRootResult:
+    path: str = field()
+    status: str = field()
+    exit_code: int = field()
+    duration_seconds: float = field()
+    to_add: int = field()
+    to_change: int = field()
+    to_destroy: int = field()
+    output: str = field()
+
+
+@object_type
+class TerraformPlanReport:
+    changed: int = field()
+    unchanged: int = field()
+    failed: int = field()
+    roots: list[TerraformRootResult] = field(default=list)
+
+
+@object_type
+class TerraformPlanArtifact:
+    output: str = field()
+    plan_file: dagger.File = field()
+    plan_json: dagger.File = field()
 
 
 @object_type
@@ -22,6 +80,116 @@ class PlatformEngineering:
         """
         return await self.run_terraform("plan", source, client_id, client_secret, subscription_id, tenant_id)
 
+    @function
+    async def plan_artifact(
+        self,
+        source: dagger.Directory,
+        client_id: Annotated[dagger.Secret, Doc("Azure Client ID")],
+        client_secret: Annotated[dagger.Secret, Doc("Azure Client Secret")],
+        subscription_id: Annotated[dagger.Secret, Doc("Azure Subscription ID")],
+        tenant_id: Annotated[dagger.Secret, Doc("Azure Tenant ID")],
+    ) -> TerraformPlanArtifact:
+        """
+        Runs `terraform plan -out` and returns the saved plan together with its JSON rendering.
+
+        Pass `plan_file` to `apply` to apply exactly this plan without refreshing and diffing again.
+        `plan_json` is the output of `terraform show -json` for tools that need a machine-readable plan.
+        """
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "plan-artifact")
+        try:
+            container = await self.terraform_container(source, client_id, client_secret, subscription_id, tenant_id)
+            container = await telemetry.exec_step("terraform init", self.terraform_init(container, "-input=false"))
+            container = await telemetry.exec_step(
+                "terraform plan", container.with_exec(["terraform", "plan", "-input=false", f"-out={PLAN_FILE_PATH}"])
+            )
+            output = await container.stdout()
+            rendered = await telemetry.exec_step(
+                "terraform show",
+                container.with_exec(["terraform", "show", "-json", PLAN_FILE_PATH], redirect_stdout=PLAN_JSON_PATH),
+            )
+        finally:
+            await telemetry.save()
+
+        return TerraformPlanArtifact(
+            output=output,
+            plan_file=container.file(PLAN_FILE_PATH),
+            plan_json=rendered.file(PLAN_JSON_PATH),
+        )
+
+    @function
+    async def plan_all(
+        self,
+        source: dagger.Directory,
+        client_id: Annotated[dagger.Secret, Doc("Azure Client ID")],
+        client_secret: Annotated[dagger.Secret, Doc("Azure Client Secret")],
+        subscription_id: Annotated[dagger.Secret, Doc("Azure Subscription ID")],
+        tenant_id: Annotated[dagger.Secret, Doc("Azure Tenant ID")],
+        max_concurrency: Annotated[int, Doc("Maximum number of roots planned at the same time")] = 4,
+    ) -> TerraformPlanReport:
+        """
+        Runs `terraform init` and `terraform plan` for every root module under the source directory.
+
+        A root module is a directory with a `.tf` file declaring a provider or backend block. Roots are
+        planned in parallel and collected into one report. Full plan output is only kept for roots that
+        have changes or failed. A root whose init fails is reported with the init output and not planned.
+        """
+        telemetry = RunTelemetry(TELEMETRY_MODULE, "plan-all")
+        roots = await self.find_root_modules(source)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def plan_root(root: str) -> TerraformRootResult:
+            async with semaphore, telemetry.step(f"plan {root}", kind="exec", root=root) as record:
+                start = time.perf_counter()
+                container = self.terraform_init(
+                    await self.terraform_container(source, client_id, client_secret, subscription_id, tenant_id, root),
+                    "-input=false",
+                    "-no-color",
+                    expect=dagger.ReturnType.ANY,
+                )
+                # A failed init is the real cause, a plan after it would only report follow-on errors
+                exit_code = await container.exit_code()
+                if exit_code == 0:
+                    # 0 means no changes, 2 means changes are pending, anything else is an error
+                    container = container.with_exec(
+                        ["terraform", "plan", "-input=false", "-no-color", "-detailed-exitcode"],
+                        expect=dagger.ReturnType.ANY,
+                    )
+                    exit_code = await container.exit_code()
+                else:
+                    record["init_failed"] = True
+                output = await container.stdout()
+                if exit_code not in (0, 2):
+                    output += await container.stderr()
+                duration = time.perf_counter() - start
+                record["exit_code"] = exit_code
+
+            counts = PLAN_SUMMARY.search(output)
+            to_add, to_change, to_destroy = (int(n) for n in counts.groups()) if counts else (0, 0, 0)
+            status = "failed" if record.get("init_failed") else {0: "unchanged", 2: "changed"}.get(exit_code, "failed")
+
+            return TerraformRootResult(
+                path=root,
+                status=status,
+                exit_code=exit_code,
+                duration_seconds=duration,
+                to_add=to_add,
+                to_change=to_change,
+                to_destroy=to_destroy,
+                output="" if status == "unchanged" else output,
+            )
+
+        try:
+            results = await asyncio.gather(*(plan_root(root) for root in roots))
+        finally:
+            await telemetry.save()
+
+        return TerraformPlanReport(
+            changed=sum(r.status == "changed" for r in results),
+            unchanged=sum(r.status == "unchanged" for r in results),
+            failed=sum(r.status == "failed" for r in results),
+            roots=list(results),
+        )
+
     @function
     async def apply(
         self,
@@ -30,14 +198,143 @@ class PlatformEngineering:
         client_secret: Annotated[dagger.Secret, Doc("Azure Client Secret")],
         subscription_id: Annotated[dagger.Secret, Doc("Azure Subscription ID")],
         tenant_id: Annotated[dagger.Secret, Doc("Azure Tenant ID")],
+        plan_file: Annotated[dagger.File | None, Doc("Saved plan from plan-artifact to apply as is")] = None,
     ) -> str:
         """
         Runs `terraform apply` to apply the planned changes using Azure authentication.
 
         This function first ensures Terraform is initialized, then executes the apply step.
         The execution is done inside a container, securely injecting the necessary secrets.
+        When a saved plan is given it is applied directly, skipping a second refresh and diff.
+        """
+        return await self.run_terraform("apply", source, client_id, client_secret, subscription_id, tenant_id, plan_file)
+
+    async def find_root_modules(self, source: dagger.Directory) -> list[str]:
+        """
+        Finds the directories under source that contain a provider or backend block.
         """
-        return await self.run_terraform("apply", source, client_id, client_secret, subscription_id, tenant_id)
+        tf_files = [
+            path for path in await source.glob("**/*.tf")
+            if ".terraform/" not in path
+        ]
+        contents = await asyncio.gather(*(source.file(path).contents() for path in tf_files))
+
+        return sorted({
+            os.path.dirname(path) or "."
+            for path, content in zip(tf_files, contents)
+            if ROOT_MODULE_BLOCK.search(content)
+        })
+
+    async def terraform_container(
+        self,
+        directory_arg: dagger.Directory,
+        client_id: dagger.Secret,
+        client_secret: dagger.Secret,
+        subscription_id: dagger.Secret,
+        tenant_id: dagger.Secret,
+        root: str = ".",
+        cache_prefix: str = "terraform",
+    ) -> dagger.Container:
+        """
+        Returns a Terraform container with the directory mounted at /mnt and Azure credentials injected.
+
+        The whole directory is mounted so relative module sources keep working, and the working
+        directory is set to the root module.
+
+        - Providers are downloaded once into a shared plugin cache volume (`TF_PLUGIN_CACHE_DIR`).
+          Run `terraform init` through `terraform_init`, which holds the volume exclusively.
+        - The root's `.terraform` directory lives in a cache volume keyed on the root, its
+          `.terraform.lock.hcl` and its backend and module blocks, so `terraform init` reuses it
+          until one of them changes. Sources that share a root path and lock file but use another
+          backend, such as `envs/dev` and `envs/prod`, get volumes of their own.
+        """
+        workdir = os.path.normpath(os.path.join("/mnt", root))
+        lock_file = os.path.normpath(os.path.join(root, ".terraform.lock.hcl"))
+        lock_contents = ""
+        if await directory_arg.glob(lock_file):
+            lock_contents = await directory_arg.file(lock_file).contents()
+        tf_files = sorted(await directory_arg.glob(os.path.normpath(os.path.join(root, "*.tf"))))
+        tf_contents = await asyncio.gather(*(directory_arg.file(path).contents() for path in tf_files))
+        init_config = "\n".join(init_config_blocks(content) for content in tf_contents)
+        dot_terraform_key = hashlib.sha256(f"{root}\n{lock_contents}\n{init_config}".encode()).hexdigest()[:16]
+
+        return (
+            dag.container()
+            .from_("hashicorp/terraform:1.11")  # Use official Terraform image
+            .with_mounted_directory("/mnt", directory_arg)
+            .with_workdir(workdir)
+            .with_mounted_cache(
+                PLUGIN_CACHE_DIR,
+                dag.cache_volume(f"{cache_prefix}-plugin-cache"),
+                sharing=dagger.CacheSharingMode.SHARED,
+            )
+            .with_env_variable("TF_PLUGIN_CACHE_DIR", PLUGIN_CACHE_DIR)
+            .with_mounted_cache(
+                f"{workdir}/.terraform",
+                dag.cache_volume(f"{cache_prefix}-dot-terraform-{dot_terraform_key}"),
+                sharing=dagger.CacheSharingMode.LOCKED,
+            )
+            .with_secret_variable("ARM_CLIENT_ID", client_id)
+            .with_secret_variable("ARM_CLIENT_SECRET", client_secret)
+            .with_secret_variable("ARM_SUBSCRIPTION_ID", subscription_id)
+            .with_secret_variable("ARM_TENANT_ID", tenant_id)
+        )
+
+    def terraform_init(
+        self,
+        container: dagger.Container,
+        *args: str,
+        cache_prefix: str = "terraform",
+        expect: dagger.ReturnType = dagger.ReturnType.SUCCESS,
+    ) -> dagger.Container:
+        """
+        Runs `terraform init` with the plugin cache locked, then shares the cache again.
+
+        Terraform's plugin cache is not safe for concurrent writers, and `init` is the only
+        command that writes to it. Concurrent inits, as in `plan_all`, therefore take turns.
+        Plans and applies only read the providers the lock file already pins, so they keep
+        running in parallel.
+        """
+        plugin_cache = dag.cache_volume(f"{cache_prefix}-plugin-cache")
+        return (
+            container
+            .with_mounted_cache(PLUGIN_CACHE_DIR, plugin_cache, sharing=dagger.CacheSharingMode.LOCKED)
+            .with_exec(["terraform", "init", *args], expect=expect)
+            .with_mounted_cache(PLUGIN_CACHE_DIR, plugin_cache, sharing=dagger.CacheSharingMode.SHARED)
+        )
+
+    @function
+    async def benchmark_init(
+        self,
+        source: dagger.Directory,
+        client_id: Annotated[dagger.Secret, Doc("Azure Client ID")],
+        client_secret: Annotated[dagger.Secret, Doc("Azure Client Secret")],
+        subscription_id: Annotated[dagger.Secret, Doc("Azure Subscription ID")],
+        tenant_id: Annotated[dagger.Secret, Doc("Azure Tenant ID")],
+    ) -> str:
+        """
+        Reports cold versus warm `terraform init` time.
+
+        The cold run uses empty cache volumes made for this benchmark, and the warm run reuses them.
+        """
+        cache_prefix = f"terraform-benchmark-{uuid.uuid4().hex[:8]}"
+        container = await self.terraform_container(
+            source, client_id, client_secret, subscription_id, tenant_id, cache_prefix=cache_prefix
+        )
+
+        timings = {}
+        for label in ["cold", "warm"]:
+            start = time.perf_counter()
+            await self.terraform_init(
+                container.with_env_variable("INIT_NONCE", uuid.uuid4().hex), "-input=false", cache_prefix=cache_prefix
+            ).sync()
+            timings[label] = time.perf_counter() - start
+
+        return (
+            f"cold init: {timings['cold']:.2f}s\n"
+            f"warm init: {timings['warm']:.2f}s\n"
+            f"saved: {timings['cold'] - timings['warm']:.2f}s"
+        )
 
     async def run_terraform(
         self,
@@ -47,6 +344,7 @@ class PlatformEngineering:
         client_secret: dagger.Secret,
         subscription_id: dagger.Secret,
         tenant_id: dagger.Secret,
+        plan_file: dagger.File | None = None,
     ) -> str:
         """
         Runs Terraform (`plan` or `apply`) with Azure authentication.
@@ -54,23 +352,33 @@ class PlatformEngineering:
         - Mounts the Terraform directory inside a Dagger container.
         - Injects Azure credentials securely as environment variables.
         - Executes Terraform commands (`terraform init`, then `terraform plan` or `terraform apply`).
+        - Applies a saved plan file as is when one is given.
         """
         terraform_command = ["terraform", command]
-        
-        # Add auto-approve if it's an apply command
-        if command == "apply":
+        container = await self.terraform_container(directory_arg, client_id, client_secret, subscription_id, tenant_id)
+
+        if command == "apply" and plan_file is not None:
+            # A saved plan is already approved, terraform applies it without prompting
+            container = container.with_file(PLAN_FILE_PATH, plan_file)
+            terraform_command += ["-input=false", PLAN_FILE_PATH]
+        elif command == "apply":
+            # Add auto-approve if it's an apply command
             terraform_command.append("-auto-approve")
 
-        container = (
-            dag.container()
-            .from_("hashicorp/terraform:1.11")  # Use official Terraform image
-            .with_mounted_directory("/mnt", directory_arg)
-            .with_workdir("/mnt")
-            .with_secret_variable("ARM_CLIENT_ID", client_id)
-            .with_secret_variable("ARM_CLIENT_SECRET", client_secret)
-            .with_secret_variable("ARM_SUBSCRIPTION_ID", subscription_id)
-            .with_secret_variable("ARM_TENANT_ID", tenant_id)
-            .with_exec(["terraform", "init"])
-            .with_exec(terraform_command)
-        )
-        return await container.stdout()
\ No newline at end of file
+        telemetry = RunTelemetry(TELEMETRY_MODULE, command)
+        try:
+            container = await telemetry.exec_step("terraform init", self.terraform_init(container))
+            container = await telemetry.exec_step(f"terraform {command}", container.with_exec(terraform_command))
+            return await container.stdout()
+        finally:
+            await telemetry.save()
+
+    @function
+    def telemetry_summaries(self) -> dagger.Directory:
+        """
+        Returns the JSON telemetry summaries of this module's past runs.
+
+        Each summary lists every step's duration and whether it was cached or only likely cached, plus the slowest steps.
+        Export them with `dagger call telemetry-summaries export --path ./telemetry`.
+        """
+        return telemetry_summaries(TELEMETRY_MODULE)